@@ -162,12 +162,11 @@ def valid_test(dataflow, split, model, device, qiskit=False):
         target_all = torch.cat(target_all, dim=0)
         output_all = torch.cat(output_all, dim=0)
 
-    _, indices = output_all.topk(1, dim=1)
-    masks = indices.eq(target_all.view(-1, 1).expand_as(indices))
     size = target_all.shape[0]
-    corrects = masks.sum().item()
-    accuracy = corrects / size
-    loss = F.nll_loss(output_all, target_all).item()
+    corrects = output_all.argmax(dim=1).eq(target_all).sum()
+    loss = F.nll_loss(output_all, target_all)
+    # fetch both metrics with a single device to host sync
+    accuracy, loss = torch.stack([corrects.float() / size, loss]).tolist()
 
     print(f"{split} set accuracy: {accuracy}")
     print(f"{split} set loss: {loss}")
@@ -214,6 +213,9 @@ def main():
             sampler=sampler,
             num_workers=8,
             pin_memory=True,
+            # every split is iterated once per epoch, keep the workers alive
+            # instead of re-spawning them on each pass
+            persistent_workers=True,
         )
 
     use_cuda = torch.cuda.is_available()
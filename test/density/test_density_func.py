@@ -0,0 +1,726 @@
+"""
+MIT License
+
+Copyright (c) 2020-present TorchQuantum Authors
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import importlib.util
+import pathlib
+
+import numpy as np
+import pytest
+import torch
+
+import torchquantum as tq
+from torchquantum.macro import C_DTYPE
+from test.utils import check_all_close
+
+
+def _load_density_func():
+    # torchquantum/density/__init__.py also imports density_mat, which
+    # depends on modules missing from this tree, so the functional module
+    # is loaded on its own
+    path = pathlib.Path(tq.__file__).parent / "density" / "density_func.py"
+    spec = importlib.util.spec_from_file_location("density_func", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+df = _load_density_func()
+
+ABC = "abcdefghijklmnopqrstuvwxy"
+
+
+def random_density(n_wires, bsz, seed=0):
+    """Random batch of densitymatrices in the [bsz] + [2] * 2n layout."""
+    gen = torch.Generator().manual_seed(seed)
+    dim = 2**n_wires
+    a = torch.randn(bsz, dim, dim, generator=gen) + 1j * torch.randn(
+        bsz, dim, dim, generator=gen
+    )
+    rho = a @ a.conj().transpose(-1, -2)
+    rho = rho / torch.diagonal(rho, dim1=-2, dim2=-1).sum(-1).reshape(-1, 1, 1)
+    return rho.to(C_DTYPE).reshape([bsz] + [2] * (2 * n_wires))
+
+
+def full_unitary(mat, wires, n_wires):
+    """Dense 2^n x 2^n unitary of mat acting on wires, with a batch dim."""
+    mat = mat.to(C_DTYPE)
+    mat = mat if mat.dim() == 3 else mat.unsqueeze(0)
+    bsz, k = mat.shape[0], len(wires)
+    dim = 2**n_wires
+
+    eye = torch.eye(dim, dtype=C_DTYPE).reshape([2] * n_wires + [dim])
+    in_indices = ABC[:n_wires]
+    new = ABC[n_wires : n_wires + k]
+    out_indices = list(in_indices)
+    for w, index in zip(wires, new):
+        out_indices[w] = index
+    equation = (
+        f"z{new}{''.join(in_indices[w] for w in wires)},{in_indices}Y"
+        f"->z{''.join(out_indices)}Y"
+    )
+    full = torch.einsum(equation, mat.reshape([bsz] + [2] * 2 * k), eye)
+    return full.reshape(bsz, dim, dim)
+
+
+def dense_apply(rho, mat, wires):
+    """U rho U^dagger with dense matrices, the reference for all paths."""
+    n_wires = (rho.dim() - 1) // 2
+    bsz, dim = rho.shape[0], 2**n_wires
+    full = full_unitary(mat, wires, n_wires)
+    rho = rho.reshape(bsz, dim, dim)
+    out = full @ rho @ full.conj().transpose(-1, -2)
+    return out.reshape([bsz] + [2] * (2 * n_wires))
+
+
+def device_with(rho):
+    n_wires = (rho.dim() - 1) // 2
+    qdev = tq.QuantumDevice(n_wires=n_wires, bsz=rho.shape[0])
+    qdev.states = rho.clone()
+    return qdev
+
+
+def _diag(*entries):
+    # entries are scalars or (bsz,) tensors, batched as (bsz, d, d)
+    entries = [torch.as_tensor(e, dtype=C_DTYPE).reshape(-1) for e in entries]
+    bsz = max(e.shape[0] for e in entries)
+    return torch.diag_embed(torch.stack([e.expand(bsz) for e in entries], -1))
+
+
+def _phase(theta):
+    return torch.exp(1j * theta.to(C_DTYPE))
+
+
+def _multirz_reference(theta, n):
+    parity = torch.tensor(
+        [(-1) ** bin(k).count("1") for k in range(2**n)], dtype=C_DTYPE
+    )
+    return torch.diag_embed(_phase(-theta.reshape(-1, 1) / 2 * parity))
+
+
+# name, wires, number of angles (None for no params), reference builder
+DIAGONAL_GATES = [
+    ("pauliz", [1], None, lambda th: _diag(1, -1)),
+    ("s", [2], None, lambda th: _diag(1, 1j)),
+    ("t", [0], None, lambda th: _diag(1, np.exp(1j * np.pi / 4))),
+    ("cz", [2, 0], None, lambda th: _diag(1, 1, 1, -1)),
+    ("rz", [1], 1, lambda th: _diag(_phase(-th / 2), _phase(th / 2))),
+    ("phaseshift", [2], 1, lambda th: _diag(1, _phase(th))),
+    ("u1", [0], 1, lambda th: _diag(1, _phase(th))),
+    ("crz", [2, 1], 1, lambda th: _diag(1, 1, _phase(-th / 2), _phase(th / 2))),
+    ("cu1", [1, 0], 1, lambda th: _diag(1, 1, 1, _phase(th))),
+    ("multirz", [2, 0, 1], 1, lambda th: _multirz_reference(th, 3)),
+]
+
+
+@pytest.mark.parametrize("name,wires,n_params,reference", DIAGONAL_GATES)
+@pytest.mark.parametrize("inverse", [False, True])
+@pytest.mark.parametrize("comp_method", ["bmm", "einsum"])
+def test_diagonal_gates(name, wires, n_params, reference, inverse, comp_method):
+    bsz = 3
+    rho = random_density(3, bsz)
+    theta = torch.tensor([0.3, -1.2, 2.5]) if n_params else None
+
+    qdev = device_with(rho)
+    df.func_name_dict[name](
+        qdev,
+        wires,
+        params=theta,
+        n_wires=len(wires),
+        inverse=inverse,
+        comp_method=comp_method,
+    )
+
+    mat = reference(theta)
+    if inverse:
+        mat = mat.conj().transpose(-1, -2)
+    check_all_close(qdev.states, dense_apply(rho, mat, wires))
+
+
+def test_apply_unitary_density_diagonal_unbatched():
+    rho = random_density(3, 2)
+    diag = _phase(torch.tensor([0.1, 0.7, -0.4, 1.9]))
+    out = df.apply_unitary_density_diagonal(rho, diag, [2, 0])
+    check_all_close(out, dense_apply(rho, torch.diag(diag), [2, 0]))
+
+
+# number of angles of the parametric gates
+PARAM_COUNTS = {
+    "rx": 1,
+    "ry": 1,
+    "rz": 1,
+    "rxx": 1,
+    "ryy": 1,
+    "rzz": 1,
+    "rzx": 1,
+    "phaseshift": 1,
+    "rot": 3,
+    "crx": 1,
+    "cry": 1,
+    "crz": 1,
+    "crot": 3,
+    "u1": 1,
+    "u2": 2,
+    "u3": 3,
+    "cu1": 1,
+    "cu2": 2,
+    "cu3": 3,
+    "su4": 15,
+    "single_excitation": 1,
+}
+
+
+@pytest.mark.parametrize("name", sorted(PARAM_COUNTS))
+@pytest.mark.parametrize("bsz", [1, 4])
+def test_builders_return_a_batch(name, bsz):
+    params = torch.rand(bsz, PARAM_COUNTS[name])
+    matrix = df.mat_dict[name](params)
+    assert matrix.dim() == 3 and matrix.shape[0] == bsz
+    if name in df.eigvals_dict:
+        eigvals = df.eigvals_dict[name](params)
+        assert eigvals.shape == (bsz, matrix.shape[-1])
+        check_all_close(torch.diag_embed(eigvals), matrix)
+
+    assert df.mat_dict["multirz"](params[:, :1], 3).shape == (bsz, 8, 8)
+    unitary = torch.linalg.qr(torch.randn(bsz, 4, 4, dtype=C_DTYPE))[0]
+    for unitary_gate in ["qubitunitary", "qubitunitaryfast", "qubitunitarystrict"]:
+        assert df.mat_dict[unitary_gate](unitary).shape == (bsz, 4, 4)
+
+
+@pytest.mark.parametrize("comp_method", ["bmm", "einsum"])
+@pytest.mark.parametrize("name,wires", [("rx", [1]), ("crx", [2, 0]), ("su4", [0, 2])])
+def test_batch_of_one_matrix_is_shared(name, wires, comp_method):
+    rho = random_density(3, 3)
+    params = torch.rand(1, PARAM_COUNTS[name])
+
+    qdev = device_with(rho)
+    df.func_name_dict[name](qdev, wires, params=params, comp_method=comp_method)
+
+    check_all_close(qdev.states, dense_apply(rho, df.mat_dict[name](params), wires))
+
+
+def partial_trace(rho, wire):
+    """Trace out one wire of a density in the [bsz] + [2] * 2n layout."""
+    n_wires = (rho.dim() - 1) // 2
+    return torch.diagonal(rho, dim1=1 + wire, dim2=1 + n_wires + wire).sum(-1)
+
+
+@pytest.mark.parametrize("wires", [1, [0, 2]])
+def test_reset(wires):
+    rho = random_density(3, 2)
+    qdev = device_with(rho)
+    df.reset(qdev, wires)
+    out = qdev.states
+
+    # reference: the Kraus operators |0><0| and |0><1| on each wire
+    zero = torch.tensor([[1, 0], [0, 0]], dtype=C_DTYPE)
+    lower = torch.tensor([[0, 1], [0, 0]], dtype=C_DTYPE)
+    expected = rho
+    for wire in [wires] if isinstance(wires, int) else wires:
+        expected = dense_apply(expected, zero, [wire]) + dense_apply(
+            expected, lower, [wire]
+        )
+    check_all_close(out, expected)
+
+    flat = out.reshape(2, 8, 8)
+    check_all_close(torch.diagonal(flat, dim1=-2, dim2=-1).sum(-1), torch.ones(2))
+    check_all_close(flat, flat.transpose(-1, -2).conj().resolve_conj())
+
+    if wires == 1:
+        # |0><0| on the reset wire times the reduced state of the others
+        reduced = partial_trace(rho, 1)
+        check_all_close(out, torch.einsum("bacdf,eg->baecdgf", reduced, zero))
+
+
+@pytest.mark.parametrize(
+    "name,n_wires,n_params",
+    [("rx", None, 1), ("u3", None, 3), ("multirz", 3, 1), ("multicnot", 3, None)],
+)
+def test_gate_matrices_many(name, n_wires, n_params):
+    builder = df.mat_dict[name]
+    params_list = [
+        None if n_params is None else torch.rand(bsz, n_params) for bsz in [2, 1, 3]
+    ]
+    matrices = df.gate_matrices_many(name, params_list, n_wires)
+
+    assert len(matrices) == len(params_list)
+    for params, matrix in zip(params_list, matrices):
+        if n_params is None:
+            expected = builder(n_wires)
+        elif n_wires is None:
+            expected = builder(params)
+        else:
+            expected = builder(params, n_wires)
+        check_all_close(matrix, expected)
+
+
+def test_gate_matrices_many_needs_n_wires():
+    with pytest.raises(ValueError):
+        df.gate_matrices_many("multirz", [torch.rand(2, 1)])
+
+
+def _mixed_ops(bsz):
+    gen = torch.Generator().manual_seed(1)
+    unitary = torch.linalg.qr(torch.randn(4, 4, dtype=C_DTYPE))[0]
+    return [
+        ("hadamard", [0], None),
+        ("rx", [1], torch.rand(bsz, generator=gen)),
+        ("u3", [2], torch.rand(bsz, 3, generator=gen)),
+        ("multirz", [0, 2, 1], torch.rand(bsz, generator=gen)),
+        ("cnot", [2, 0], None),
+        ("multicnot", [1, 2, 0], None),
+        ("qubitunitary", [1, 0], unitary),
+        ("rx", [0], torch.rand(bsz, 1, generator=gen)),
+    ]
+
+
+def _sequential(rho, ops):
+    qdev = device_with(rho)
+    for name, wires, params in ops:
+        df.func_name_dict[name](qdev, wires, params=params, n_wires=len(wires))
+    return qdev.states
+
+
+@pytest.mark.parametrize(
+    "apply", [df.apply_density_ops, df.contract_density_ops, df.fused_apply]
+)
+def test_ops_read_params_like_gate_wrapper(apply):
+    rho = random_density(3, 2)
+    ops = _mixed_ops(2)
+
+    qdev = device_with(rho)
+    apply(qdev, ops)
+    check_all_close(qdev.states, _sequential(rho, ops))
+
+
+# name, wires with the controls first, reference matrix
+PERMUTATION_GATES = [
+    ("cnot", [0, 2], df.mat_dict["cnot"]),
+    ("cnot", [3, 1], df.mat_dict["cnot"]),
+    ("toffoli", [0, 1, 3], df.mat_dict["toffoli"]),
+    ("toffoli", [3, 2, 0], df.mat_dict["toffoli"]),
+    ("multicnot", [0, 3, 1, 2], df.multicnot_matrix(4)),
+    ("multicnot", [2, 3, 0], df.multicnot_matrix(3)),
+    ("multixcnot", [0, 1, 3], df.multixcnot_matrix(3)),
+    ("multixcnot", [3, 2, 1, 0], df.multixcnot_matrix(4)),
+    ("swap", [1, 3], df.mat_dict["swap"]),
+    ("swap", [2, 0], df.mat_dict["swap"]),
+    ("cswap", [0, 1, 3], df.mat_dict["cswap"]),
+    ("cswap", [3, 2, 0], df.mat_dict["cswap"]),
+]
+
+
+@pytest.mark.parametrize("name,wires,reference", PERMUTATION_GATES)
+@pytest.mark.parametrize("inverse", [False, True])
+def test_permutation_gates(name, wires, reference, inverse):
+    rho = random_density(4, 2)
+    qdev = device_with(rho)
+    df.func_name_dict[name](qdev, wires, n_wires=len(wires), inverse=inverse)
+
+    # all of them are their own inverse
+    check_all_close(qdev.states, dense_apply(rho, reference, wires))
+
+
+def test_qubitunitarystrict_cache():
+    gen = torch.Generator().manual_seed(2)
+    params = torch.randn(2, 4, 4, dtype=C_DTYPE, generator=gen)
+    builder = df.mat_dict["qubitunitarystrict"]
+
+    first = builder(params)
+    second = builder(params)
+    assert second is first
+    identity = first @ first.transpose(-1, -2).conj().resolve_conj()
+    check_all_close(identity, torch.eye(4).expand(2, 4, 4))
+
+    # the views of gate_wrapper share the entry of their base
+    view = builder(params[0])
+    check_all_close(view, first[0])
+
+    params.copy_(torch.randn(2, 4, 4, dtype=C_DTYPE, generator=gen))
+    refreshed = builder(params)
+    U, _, Vh = torch.linalg.svd(params)
+    check_all_close(refreshed, U @ Vh)
+    assert builder(params) is refreshed
+
+    key = id(params)
+    del params, first, second, view, refreshed
+    assert key not in df._strict_unitary_cache
+
+
+def test_const_eigvals_cached_on_density_dtype():
+    rho = random_density(2, 2).to(torch.complex128)
+    qdev = device_with(rho)
+    df.s(qdev, 1)
+    df.s(qdev, 1)
+
+    eigvals = df._const_eigvals_on_device("s", torch.complex128, rho.device)
+    assert eigvals.dtype == torch.complex128
+    assert eigvals is df._const_eigvals_on_device("s", torch.complex128, rho.device)
+    expected = dense_apply(rho.to(C_DTYPE), df.mat_dict["pauliz"], [1])
+    check_all_close(qdev.states, expected)
+
+
+def _batched_kron(a, b):
+    return torch.einsum("bij,bkl->bikjl", a, b).reshape(a.shape[0], 4, 4)
+
+
+def _su4_reference(params):
+    # the circuit of Fig 2 of the paper cited by su4_matrix, as a chain of
+    # dense 4x4 products: (a x b) CNOT (rx x rz) CNOT (c x d) CNOT (I x rz)
+    rz1 = df.rz_matrix(params[:, 0:1])
+    rx1 = df.rx_matrix(params[:, 1:2])
+    rz2 = df.rz_matrix(params[:, 2:3])
+    a, b, c, d = [df.u3_matrix(params[:, k : k + 3]) for k in [3, 6, 9, 12]]
+    eye = torch.eye(2, dtype=C_DTYPE).expand_as(rz1)
+    cnot = df.mat_dict["cnot"]
+    return (
+        _batched_kron(a, b)
+        @ cnot
+        @ _batched_kron(rx1, rz2)
+        @ cnot
+        @ _batched_kron(c, d)
+        @ cnot
+        @ _batched_kron(eye, rz1)
+    )
+
+
+@pytest.mark.parametrize("bsz", [1, 5])
+def test_su4_matrix(bsz):
+    params = torch.rand(bsz, 15, generator=torch.Generator().manual_seed(3)) * 6
+    matrix = df.su4_matrix(params)
+
+    identity = matrix @ matrix.transpose(-1, -2).conj().resolve_conj()
+    check_all_close(identity, torch.eye(4).expand(bsz, 4, 4))
+    check_all_close(matrix, _su4_reference(params))
+
+
+FUSED_OPS = [
+    [("paulix", 0, None), ("pauliy", 1, None), ("pauliz", 0, None)],
+    [("swap", [0, 2], None), ("paulix", 0, None), ("pauliy", 2, None)],
+    [
+        ("pauliy", 1, None),
+        ("swap", [1, 2], None),
+        ("pauliz", 1, None),
+        ("swap", [0, 1], None),
+        ("paulix", 0, None),
+        ("pauliy", 0, None),
+    ],
+    [
+        ("x", 2, None),
+        ("swap", [2, 1], None),
+        ("rx", [1], torch.tensor([0.3, 1.1])),
+        ("pauliz", 1, None),
+        ("i", 0, None),
+        ("swap", [0, 1], None),
+        ("y", 0, None),
+    ],
+    [("rx", [0], torch.tensor([0.7, -0.2])), ("swap", [0, 2], None)],
+]
+
+
+def _explicit_matrix(name, params):
+    # written out independently of mat_dict and the gate functions
+    if name == "rx":
+        cos = torch.cos(params / 2).to(C_DTYPE)
+        sin = -1j * torch.sin(params / 2).to(C_DTYPE)
+        return torch.stack([cos, sin, sin, cos], -1).reshape(-1, 2, 2)
+    matrices = {
+        "paulix": [[0, 1], [1, 0]],
+        "x": [[0, 1], [1, 0]],
+        "pauliy": [[0, -1j], [1j, 0]],
+        "y": [[0, -1j], [1j, 0]],
+        "pauliz": [[1, 0], [0, -1]],
+        "i": [[1, 0], [0, 1]],
+        "swap": [[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]],
+    }
+    return torch.tensor(matrices[name], dtype=C_DTYPE)
+
+
+@pytest.mark.parametrize("ops", FUSED_OPS)
+def test_fused_apply(ops):
+    rho = random_density(3, 2)
+    qdev = device_with(rho)
+    df.fused_apply(qdev, ops)
+
+    expected = rho
+    for name, wires, params in ops:
+        wires = [wires] if isinstance(wires, int) else wires
+        expected = dense_apply(expected, _explicit_matrix(name, params), wires)
+    check_all_close(qdev.states, expected)
+
+
+def test_fused_apply_returns_new_storage():
+    rho = random_density(3, 2)
+    qdev = device_with(rho)
+    states = qdev.states
+    df.fused_apply(qdev, [("swap", [0, 2], None)])
+
+    qdev.states.zero_()
+    check_all_close(states, rho)
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, C_DTYPE])
+@pytest.mark.parametrize("batched", [False, True])
+@pytest.mark.parametrize(
+    "wires_list", [[(0, 2)], [(0, 1), (1, 2), (2, 0), (0, 1)], [(3, 1), (1, 0)]]
+)
+def test_apply_rzz_layer(wires_list, batched, dtype):
+    rho = random_density(4, 2)
+    gen = torch.Generator().manual_seed(4)
+    shape = (2, len(wires_list)) if batched else (len(wires_list),)
+    thetas = (torch.rand(shape, generator=gen) * 6).to(dtype)
+
+    qdev = device_with(rho)
+    df.apply_rzz_layer(qdev, wires_list, thetas)
+
+    expected = device_with(rho)
+    for k, wires in enumerate(wires_list):
+        df.rzz(expected, list(wires), params=thetas[..., k].reshape(-1))
+    check_all_close(qdev.states, expected.states)
+
+
+def test_apply_rzz_layer_empty():
+    rho = random_density(2, 2)
+    qdev = device_with(rho)
+    df.apply_rzz_layer(qdev, [], torch.zeros(0))
+    check_all_close(qdev.states, rho)
+
+
+def test_contract_density_ops():
+    bsz = 3
+    rho = random_density(3, bsz)
+    gen = torch.Generator().manual_seed(5)
+    unitaries = torch.randn(bsz, 4, 4, dtype=C_DTYPE, generator=gen)
+    unitaries = torch.linalg.qr(unitaries)[0]
+    ops = [
+        ("hadamard", [1], None),
+        # a batched matrix and matrices shared by the batch
+        ("qubitunitary", [2, 0], unitaries),
+        ("qubitunitary", [0, 1], unitaries[:1]),
+        ("rx", [2], torch.rand(1, 1, generator=gen)),
+        ("u3", [0], torch.rand(bsz, 3, generator=gen)),
+        ("cnot", [1, 2], None),
+        ("crx", [2, 1], torch.rand(bsz, 1, generator=gen)),
+    ]
+
+    qdev = device_with(rho)
+    df.contract_density_ops(qdev, ops)
+    check_all_close(qdev.states, _sequential(rho, ops))
+
+    fused = device_with(rho)
+    df.apply_density_ops(fused, ops)
+    check_all_close(qdev.states, fused.states)
+
+
+@pytest.mark.parametrize(
+    "a_batched,b_batched", [(False, False), (True, False), (True, True)]
+)
+def test_kron(a_batched, b_batched):
+    gen = torch.Generator().manual_seed(6)
+    a = torch.randn([2] * a_batched + [2, 3], generator=gen)
+    b = torch.randn([2] * b_batched + [3, 2], generator=gen)
+    # transposed inputs, as the Q of a QR decomposition
+    a, b = a.transpose(-1, -2), b.transpose(-1, -2)
+
+    product = torch.einsum("...ij,...kl->...ikjl", a, b)
+    expected = product.reshape(product.shape[:-4] + (6, 6))
+    check_all_close(df.kron(a, b), expected)
+
+
+def random_unitary(n_wires, bsz=None, seed=0):
+    gen = torch.Generator().manual_seed(seed)
+    shape = [2**n_wires, 2**n_wires] if bsz is None else [bsz] + [2**n_wires] * 2
+    return torch.linalg.qr(torch.randn(shape, dtype=C_DTYPE, generator=gen))[0]
+
+
+def _sequential_dense(rho, mats, wires_list):
+    for mat, wires in zip(mats, wires_list):
+        rho = dense_apply(rho, mat, wires)
+    return rho
+
+
+@pytest.mark.parametrize(
+    "wires_list",
+    [
+        # same wires, composed with a matmul
+        [[0], [0], [0]],
+        # disjoint wires, merged with kron
+        [[0], [2], [1, 3]],
+        # overlapping wires, embedded into their union
+        [[0, 1], [1, 2], [2], [3, 1]],
+        # the same pair in the reversed order
+        [[0, 1], [1, 0]],
+        [[1, 0], [0, 1], [0]],
+    ],
+)
+@pytest.mark.parametrize("max_fused_wires", [2, 4])
+def test_apply_unitary_density_bmm_many(wires_list, max_fused_wires):
+    rho = random_density(4, 2)
+    # alternate matrices shared by the batch and batched ones
+    mats = [
+        random_unitary(len(wires), None if k % 2 else 2, seed=k)
+        for k, wires in enumerate(wires_list)
+    ]
+
+    out = df.apply_unitary_density_bmm_many(rho, mats, wires_list, max_fused_wires)
+
+    expected = rho
+    for mat, wires in zip(mats, wires_list):
+        expected = df.apply_unitary_density_bmm(expected, mat, wires)
+    check_all_close(out, expected)
+    check_all_close(out, _sequential_dense(rho, mats, wires_list))
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="CUDA graphs need CUDA")
+def test_capture_layer():
+    rho = random_density(3, 2).cuda()
+    gen = torch.Generator().manual_seed(7)
+    ops = [
+        ("hadamard", [0], None),
+        ("s", [1], None),
+        ("cnot", [0, 2], None),
+        ("rz", [2], torch.rand(2, 1, generator=gen).cuda()),
+    ]
+    qdev = device_with(rho)
+    layer = df.capture_layer(qdev, ops)
+    check_all_close(qdev.states, rho)
+
+    # replay without new params keeps the last ones
+    for params in [torch.rand(2, 1, generator=gen).cuda(), None]:
+        qdev.states = rho.clone()
+        layer.replay([None, None, None, params])
+        if params is not None:
+            ops[-1] = ("rz", [2], params)
+        check_all_close(qdev.states, _sequential(rho, ops))
+
+
+@pytest.mark.parametrize("name,wires", [("rx", [1]), ("u3", [2]), ("cu3", [2, 0])])
+def test_einsum_batched_matrices(name, wires):
+    bsz = 3
+    rho = random_density(3, bsz)
+    gen = torch.Generator().manual_seed(8)
+
+    # the second call has the same shapes and reuses the cached contraction
+    for _ in range(2):
+        params = torch.rand(bsz, PARAM_COUNTS[name], generator=gen) * 6
+        hits = df._density_contract_expression.cache_info().hits
+        qdev = device_with(rho)
+        df.func_name_dict[name](qdev, wires, params=params, comp_method="einsum")
+
+        matrix = df.mat_dict[name](params)
+        check_all_close(qdev.states, dense_apply(rho, matrix, wires))
+    assert df._density_contract_expression.cache_info().hits > hits
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "apply_unitary_density_bmm_many",
+        "gate_matrices_many",
+        "apply_density_ops",
+        "contract_density_ops",
+        "capture_layer",
+        "fused_apply",
+        "apply_rzz_layer",
+        "hadamard_layer",
+        "compile_matrix_builders",
+    ],
+)
+def test_exported(name):
+    assert name in df.__all__ and callable(getattr(df, name))
+
+
+@pytest.mark.parametrize(
+    "params",
+    [torch.ones(2, 3, dtype=C_DTYPE), torch.ones(2, 2, 2, dtype=C_DTYPE)],
+)
+def test_qubitunitary_rejects_non_unitary(params):
+    with pytest.raises(ValueError):
+        df.mat_dict["qubitunitary"](params)
+
+
+@pytest.mark.parametrize("wires", [[0, 2], [1, 0, 2]])
+def test_controlled_swap_returns_new_storage(wires):
+    rho = random_density(3, 2)
+    original = rho.clone()
+    out = df.apply_controlled_swap_density(rho, wires)
+    assert out.is_contiguous()
+
+    out.zero_()
+    check_all_close(rho, original)
+
+
+@pytest.mark.skipif(not hasattr(torch, "compile"), reason="needs torch>=2.0")
+@pytest.mark.filterwarnings("ignore:Torchinductor does not support")
+def test_compile_matrix_builders():
+    names = ["rx", "u3", "su4"]
+    params = {name: torch.rand(3, PARAM_COUNTS[name]) for name in names}
+    rho = random_density(2, 3)
+    eager = device_with(rho)
+    df.u3(eager, 1, params=params["u3"])
+
+    try:
+        df.compile_matrix_builders(names)
+        for name in names:
+            compiled = df._compiled_builders[df.mat_dict[name]](params[name])
+            check_all_close(compiled, df.mat_dict[name](params[name]))
+
+        # gate_wrapper goes through the compiled builder
+        qdev = device_with(rho)
+        df.u3(qdev, 1, params=params["u3"])
+        check_all_close(qdev.states, eager.states)
+    finally:
+        df._compiled_builders.clear()
+
+
+@pytest.mark.parametrize(
+    "name,wires",
+    [("rx", [1]), ("ry", [0]), ("rxx", [2, 0]), ("ryy", [0, 1]), ("crx", [2, 1])],
+)
+@pytest.mark.parametrize("comp_method", ["bmm", "einsum"])
+def test_inverse_by_negation(name, wires, comp_method):
+    assert name in df._inverse_by_negation
+    rho = random_density(3, 2)
+    params = torch.rand(2, 1, generator=torch.Generator().manual_seed(9)) * 6
+
+    qdev = device_with(rho)
+    df.func_name_dict[name](
+        qdev, wires, params=params, inverse=True, comp_method=comp_method
+    )
+
+    dagger = df.mat_dict[name](params).transpose(-1, -2).conj().resolve_conj()
+    check_all_close(qdev.states, dense_apply(rho, dagger, wires))
+
+
+@pytest.mark.parametrize("dtype", [C_DTYPE, torch.complex128])
+@pytest.mark.parametrize("wires", [None, 1, [2, 0]])
+def test_hadamard_layer(wires, dtype):
+    rho = random_density(3, 2).to(dtype)
+    qdev = device_with(rho)
+    df.hadamard_layer(qdev, wires)
+
+    expected = device_with(rho)
+    for wire in range(3) if wires is None else np.atleast_1d(wires).tolist():
+        df.hadamard(expected, wire)
+    assert qdev.states.dtype == dtype
+    check_all_close(qdev.states, expected.states)
@@ -23,15 +23,17 @@ SOFTWARE.
 """
 
 import functools
+import itertools
+import weakref
 import torch
 import numpy as np
+import opt_einsum as oe
 import torchquantum as tq
 
 from typing import Callable, Union, Optional, List, Dict
-from .macro import C_DTYPE, ABC, ABC_ARRAY, INV_SQRT2
-from .util.utils import pauli_eigs, diag
+from torchquantum.macro import C_DTYPE, ABC, ABC_ARRAY, INV_SQRT2
+from torchquantum.util.utils import pauli_eigs, diag
 #from torchpack.utils.logging import logger
-from torchquantum.util import normalize_statevector
 
 __all__ = [
     "func_name_dict",
@@ -101,60 +103,52 @@ __all__ = [
     "cr",
     "cphase",
     "reset",
+    "apply_unitary_density_bmm_many",
+    "gate_matrices_many",
+    "apply_density_ops",
+    "contract_density_ops",
+    "capture_layer",
+    "fused_apply",
+    "apply_rzz_layer",
+    "hadamard_layer",
+    "compile_matrix_builders",
 ]
 
 
-def apply_unitary_density_einsum(density, mat, wires):
-    """Apply the unitary to the densitymatrix using torch.einsum method.
+@functools.lru_cache(maxsize=4096)
+def _density_einsum_indices(n_qubit, wires, is_batch_unitary):
+    """Build the einsum equation of U rho U^dagger.
+
+    The row indices of the affected wires are contracted with U and the
+    column indices with conj(U) in a single equation, so that the
+    contraction order can be optimized as a whole. The equation only
+    depends on the number of qubits, the target wires and whether the
+    unitary is batched, so it is cached instead of being rebuilt on every
+    gate application.
 
     Args:
-        density (torch.Tensor): The densitymatrix.
-        mat (torch.Tensor): The unitary matrix of the operation.
-        wires (int or List[int]): Which qubit the operation is applied to.
+        n_qubit (int): The number of qubits of the densitymatrix.
+        wires (Tuple[int]): Which qubit the operation is applied to.
+        is_batch_unitary (bool): Whether the unitary has a batch dimension.
 
     Returns:
-        torch.Tensor: The new statevector.
-    """
-    
-    device_wires = wires
-    n_qubit = int((density.dim() - 1) / 2)
-
-    # minus one because of batch
-    total_wires = len(density.shape) - 1
-
-    if len(mat.shape) > 2:
-        is_batch_unitary = True
-        bsz = mat.shape[0]
-        shape_extension = [bsz]
-    else:
-        is_batch_unitary = False
-        shape_extension = []
-
+        str: The equation with operands (U, rho, conj(U)).
     """
-    Compute U \rho
-    """
-    mat = mat.view(shape_extension + [2] * len(device_wires) * 2)
-    mat = mat.type(C_DTYPE).to(density.device)
-    if len(mat.shape) > 2:
-        # both matrix and state are in batch mode
-        # matdag is the dagger of mat
-        matdag = torch.conj(mat.permute([0, 2, 1]))
-    else:
-        # matrix no batch, state in batch mode
-        matdag = torch.conj(mat.permute([1, 0]))
+    total_wires = 2 * n_qubit
+    n_affected = len(wires)
 
-    # Tensor indices of the quantum state
+    # Tensor indices of the densitymatrix
     density_indices = ABC[:total_wires]
-    print("density_indices", density_indices)
 
-    # Indices of the quantum state affected by this operation
-    affected_indices = "".join(ABC_ARRAY[list(device_wires)].tolist())
-    print("affected_indices", affected_indices)
+    # Indices of the densitymatrix affected by this operation, rows then
+    # columns
+    affected_indices = "".join(
+        ABC_ARRAY[list(wires) + [w + n_qubit for w in wires]].tolist()
+    )
 
     # All affected indices will be summed over, so we need the same number
     # of new indices
-    new_indices = ABC[total_wires : total_wires + len(device_wires)]
-    print("new_indices", new_indices)
+    new_indices = ABC[total_wires : total_wires + 2 * n_affected]
 
     # The new indices of the state are given by the old ones with the
     # affected indices replaced by the new_indices
@@ -163,67 +157,187 @@ def apply_unitary_density_einsum(density, mat, wires):
         zip(affected_indices, new_indices),
         density_indices,
     )
-    print("new_density_indices", new_density_indices)
 
     # Use the last literal as the indice of batch
-    density_indices = ABC[-1] + density_indices
-    new_density_indices = ABC[-1] + new_density_indices
-    if is_batch_unitary:
-        new_indices = ABC[-1] + new_indices
-
-    # We now put together the indices in the notation numpy einsum
-    # requires
-    einsum_indices = (
-        f"{new_indices}{affected_indices}," f"{density_indices}->{new_density_indices}"
+    batch_index = ABC[-1]
+    mat_batch_index = batch_index if is_batch_unitary else ""
+
+    left_mat_indices = (
+        f"{mat_batch_index}{new_indices[:n_affected]}"
+        f"{affected_indices[:n_affected]}"
+    )
+    right_mat_indices = (
+        f"{mat_batch_index}{new_indices[n_affected:]}"
+        f"{affected_indices[n_affected:]}"
     )
-    print("einsum_indices", einsum_indices)
 
-    new_density = torch.einsum(einsum_indices, mat, density)
+    return (
+        f"{left_mat_indices},{batch_index}{density_indices},{right_mat_indices}"
+        f"->{batch_index}{new_density_indices}"
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def _density_contract_expression(equation, mat_shape, density_shape):
+    """Build the opt_einsum expression of U rho U^dagger.
+
+    The contraction path is searched once per equation and operand shapes
+    and then reused, instead of being searched on every einsum call.
 
+    Args:
+        equation (str): The equation from _density_einsum_indices.
+        mat_shape (Tuple[int]): The shape of U, which is also the shape of
+            conj(U).
+        density_shape (Tuple[int]): The shape of the densitymatrix.
+
+    Returns:
+        opt_einsum.contract.ContractExpression: The contraction with
+            operands (U, rho, conj(U)).
     """
-    Compute U \rho U^\dagger
+    return oe.contract_expression(
+        equation, mat_shape, density_shape, mat_shape, optimize="auto"
+    )
+
+
+def apply_unitary_density_einsum(density, mat, wires):
+    """Apply the unitary to the densitymatrix using torch.einsum method.
+
+    Args:
+        density (torch.Tensor): The densitymatrix.
+        mat (torch.Tensor): The unitary matrix of the operation.
+        wires (int or List[int]): Which qubit the operation is applied to.
+
+    Returns:
+        torch.Tensor: The new densitymatrix.
     """
-    print("dagger")
 
-    # Tensor indices of the quantum state
-    density_indices = ABC[:total_wires]
-    print("density_indices", density_indices)
+    device_wires = wires
+    n_qubit = int((density.dim() - 1) / 2)
+    if mat.dim() > 2 and mat.shape[0] == 1:
+        # a batch of one is shared by the whole densitymatrix batch
+        mat = mat[0]
+    is_batch_unitary = len(mat.shape) > 2
+
+    mat = mat.to(device=density.device, dtype=density.dtype)
+    shape = list(mat.shape[:-2]) + [2] * len(device_wires) * 2
+
+    if not is_batch_unitary:
+        # matrix no batch, state in batch mode: U rho U^dagger reduces to two
+        # tensordot contractions, which avoid the einsum equation parsing
+        n_affected = len(device_wires)
+        mat = mat.reshape(shape)
+        mat_axes = list(range(n_affected))
+        contract_axes = list(range(n_affected, 2 * n_affected))
+
+        # Compute U rho on the row indices of the affected wires
+        left_dims = [w + 1 for w in device_wires]
+        new_density = torch.tensordot(mat, density, dims=(contract_axes, left_dims))
+        new_density = new_density.movedim(mat_axes, left_dims)
+
+        # Compute rho U^dagger, i.e. apply conj(U) on the column indices
+        right_dims = [w + 1 + n_qubit for w in device_wires]
+        new_density = torch.tensordot(
+            torch.conj(mat), new_density, dims=(contract_axes, right_dims)
+        )
+        return new_density.movedim(mat_axes, right_dims)
 
-    # Indices of the quantum state affected by this operation
-    affected_indices = "".join(
-        ABC_ARRAY[[x + n_qubit for x in list(device_wires)]].tolist()
+    # both matrix and state are in batch mode, U rho U^dagger is computed as
+    # one contraction of (U, rho, conj(U)) whose path is cached per shape
+    einsum_indices = _density_einsum_indices(
+        n_qubit, tuple(device_wires), is_batch_unitary
+    )
+    mat = mat.reshape(shape)
+    expr = _density_contract_expression(
+        einsum_indices, tuple(mat.shape), tuple(density.shape)
     )
-    print("affected_indices", affected_indices)
 
-    # All affected indices will be summed over, so we need the same number
-    # of new indices
-    new_indices = ABC[total_wires : total_wires + len(device_wires)]
-    print("new_indices", new_indices)
+    return expr(mat, density, torch.conj(mat), backend="torch")
 
-    # The new indices of the state are given by the old ones with the
-    # affected indices replaced by the new_indices
-    new_density_indices = functools.reduce(
-        lambda old_string, idx_pair: old_string.replace(idx_pair[0], idx_pair[1]),
-        zip(affected_indices, new_indices),
-        density_indices,
-    )
-    print("new_density_indices", new_density_indices)
 
-    density_indices = ABC[-1] + density_indices
-    new_density_indices = ABC[-1] + new_density_indices
-    if is_batch_unitary:
-        new_indices = ABC[-1] + new_indices
+def apply_unitary_density_cuquantum(density, mat, wires):
+    """Apply the unitary to the densitymatrix using cuquantum.contract.
+
+    U rho U^dagger is handed to cuTensorNet as the same single contraction
+    as in apply_unitary_density_einsum. This needs the optional cuquantum
+    package and a densitymatrix on a CUDA device; whether gradients flow
+    through the contraction depends on the installed cuquantum version.
+
+    Args:
+        density (torch.Tensor): The densitymatrix.
+        mat (torch.Tensor): The unitary matrix of the operation.
+        wires (int or List[int]): Which qubit the operation is applied to.
+
+    Returns:
+        torch.Tensor: The new densitymatrix.
+    """
+    from cuquantum import contract
+
+    device_wires = wires
+    n_qubit = int((density.dim() - 1) / 2)
+    if mat.dim() > 2 and mat.shape[0] == 1:
+        mat = mat[0]
+    is_batch_unitary = len(mat.shape) > 2
 
-    # We now put together the indices in the notation numpy einsum
-    # requires
-    einsum_indices = (
-        f"{density_indices}," f"{affected_indices}{new_indices}->{new_density_indices}"
+    mat = mat.to(device=density.device, dtype=density.dtype)
+    shape = list(mat.shape[:-2]) + [2] * len(device_wires) * 2
+    mat = mat.reshape(shape)
+    einsum_indices = _density_einsum_indices(
+        n_qubit, tuple(device_wires), is_batch_unitary
     )
-    print("einsum_indices", einsum_indices)
 
-    new_density = torch.einsum(einsum_indices, density, matdag)
+    return contract(einsum_indices, mat, density, torch.conj(mat))
 
-    return new_density
+
+@functools.lru_cache(maxsize=4096)
+def _bmm_density_permutations(n_qubit, wires):
+    """Build the permutations used by apply_unitary_density_bmm.
+
+    The left permutation moves the row dims of the wires right after the
+    batch dim, the right one moves the column dims of the wires to the end.
+    The front permutation moves the row dims of the wires before the batch
+    dim, so that a matrix shared by the batch is applied with a single
+    matmul. They only depend on the number of qubits and the target wires,
+    so they are cached instead of being rebuilt on every gate application.
+
+    Args:
+        n_qubit (int): The number of qubits of the densitymatrix.
+        wires (Tuple[int]): Which qubit the operation is applied to.
+
+    Returns:
+        Tuple[Tuple[int]]: permute_to and permute_back for U rho, then
+            permute_to and permute_back for rho U^dagger, then permute_to
+            and permute_back for U rho with a shared U.
+    """
+
+    def _inverse(permutation):
+        inverse = [0] * len(permutation)
+        for k, p in enumerate(permutation):
+            inverse[p] = k
+        return tuple(inverse)
+
+    total_dims = 2 * n_qubit + 1
+
+    devices_dims = [w + 1 for w in wires]
+    permute_to = [d for d in range(total_dims) if d not in devices_dims]
+    permute_to_left = tuple(permute_to[:1] + devices_dims + permute_to[1:])
+
+    devices_dims = [w + 1 + n_qubit for w in wires]
+    permute_to = [d for d in range(total_dims) if d not in devices_dims]
+    permute_to_right = tuple(permute_to + devices_dims)
+
+    devices_dims = [w + 1 for w in wires]
+    permute_to_front = tuple(
+        devices_dims + [d for d in range(total_dims) if d not in devices_dims]
+    )
+
+    return (
+        permute_to_left,
+        _inverse(permute_to_left),
+        permute_to_right,
+        _inverse(permute_to_right),
+        permute_to_front,
+        _inverse(permute_to_front),
+    )
 
 
 def apply_unitary_density_bmm(density, mat, wires):
@@ -240,57 +354,460 @@ def apply_unitary_density_bmm(density, mat, wires):
     device_wires = wires
     n_qubit = int((density.dim() - 1) / 2)
 
-    mat = mat.type(C_DTYPE).to(density.device)
-    """
-    Compute U \rho
-    """
-    devices_dims = [w + 1 for w in device_wires]
-    permute_to = list(range(density.dim()))
-    for d in sorted(devices_dims, reverse=True):
-        del permute_to[d]
-    permute_to = permute_to[:1] + devices_dims + permute_to[1:]
-    permute_back = list(np.argsort(permute_to))
+    mat = mat.to(device=density.device, dtype=density.dtype)
+    (
+        permute_to_left,
+        permute_back_left,
+        permute_to_right,
+        permute_back_right,
+        permute_to_front,
+        permute_back_front,
+    ) = _bmm_density_permutations(n_qubit, tuple(device_wires))
     original_shape = density.shape
-    permuted = density.permute(permute_to).reshape(
-        [original_shape[0], mat.shape[-1], -1]
-    )
+
+    # Compute U rho
     if len(mat.shape) > 2:
-        # both matrix and state are in batch mode
-        new_density = mat.bmm(permuted)
+        # both matrix and state are in batch mode, a batch of one is expanded
+        permuted = density.permute(permute_to_left).reshape(
+            [original_shape[0], mat.shape[-1], -1]
+        )
+        new_density = mat.expand(permuted.shape[0], -1, -1).bmm(permuted)
+        new_density = new_density.view(original_shape).permute(permute_back_left)
     else:
-        # matrix no batch, state in batch mode
-        bsz = permuted.shape[0]
-        expand_shape = [bsz] + list(mat.shape)
-        new_density = mat.expand(expand_shape).bmm(permuted)
-    new_density = new_density.view(original_shape).permute(permute_back)
-    """
-    Compute U*rho*U^\dagger
-    """
-    devices_dims = [w + 1 + n_qubit for w in device_wires]
-    permute_to = list(range(density.dim()))
-    for d in sorted(devices_dims, reverse=True):
-        del permute_to[d]
-    permute_to = permute_to + devices_dims
-    permute_back = list(np.argsort(permute_to))
-    original_shape = density.shape
-    permuted = new_density.permute(permute_to).reshape(
+        # matrix no batch, state in batch mode: unfold the wires against
+        # everything else, batch included, and do one matmul
+        permuted = density.permute(permute_to_front)
+        front_shape = permuted.shape
+        new_density = mat.mm(permuted.reshape(mat.shape[-1], -1))
+        new_density = new_density.view(front_shape).permute(permute_back_front)
+
+    # Compute U rho U^dagger
+    permuted = new_density.permute(permute_to_right).reshape(
         [original_shape[0], -1, mat.shape[-1]]
     )
     if len(mat.shape) > 2:
         # both matrix and state are in batch mode
         # matdag is the dagger of mat
         matdag = torch.conj(mat.permute([0, 2, 1]))
-        new_density = permuted.bmm(matdag)
+        new_density = permuted.bmm(matdag.expand(permuted.shape[0], -1, -1))
     else:
         # matrix no batch, state in batch mode
         matdag = torch.conj(mat.permute([1, 0]))
-        bsz = permuted.shape[0]
-        expand_shape = [bsz] + list(matdag.shape)
-        new_density = permuted.bmm(matdag.expand(expand_shape))
-    new_density = new_density.view(original_shape).permute(permute_back)
+        new_density = permuted.reshape(-1, mat.shape[-1]).mm(matdag)
+    new_density = new_density.view(original_shape).permute(permute_back_right)
+    return new_density
+
+
+def apply_unitary_density_single_wire(density, mat, wire):
+    """Apply a single-qubit unitary to the DensityMatrix without permutes.
+
+    The two halves of the row dim of the wire are mixed by U, then the two
+    halves of its column dim by conj(U). This works on the densitymatrix in
+    its own layout, so the permute and reshape copies of the bmm method
+    are not needed.
+
+    Args:
+        density (torch.Tensor): The densitymatrix.
+        mat (torch.Tensor): The unitary matrix, of shape (2, 2) or
+            (bsz, 2, 2).
+        wire (int): Which qubit the operation is applied to.
+
+    Returns:
+        torch.Tensor: The new densitymatrix.
+    """
+    n_qubit = int((density.dim() - 1) / 2)
+
+    mat = mat.to(device=density.device, dtype=density.dtype)
+
+    # broadcast the entries of the (batch of) matrices over the densitymatrix
+    coeff_shape = [-1] + [1] * (2 * n_qubit)
+    m00 = mat[..., 0, 0].reshape(coeff_shape)
+    m01 = mat[..., 0, 1].reshape(coeff_shape)
+    m10 = mat[..., 1, 0].reshape(coeff_shape)
+    m11 = mat[..., 1, 1].reshape(coeff_shape)
+
+    # Compute U rho
+    row_dim = wire + 1
+    rho0 = density.narrow(row_dim, 0, 1)
+    rho1 = density.narrow(row_dim, 1, 1)
+    new_density = torch.cat([m00 * rho0 + m01 * rho1, m10 * rho0 + m11 * rho1], row_dim)
+
+    # Compute U rho U^dagger
+    col_dim = wire + 1 + n_qubit
+    rho0 = new_density.narrow(col_dim, 0, 1)
+    rho1 = new_density.narrow(col_dim, 1, 1)
+    m00, m01, m10, m11 = (torch.conj(m) for m in (m00, m01, m10, m11))
+
+    return torch.cat([m00 * rho0 + m01 * rho1, m10 * rho0 + m11 * rho1], col_dim)
+
+
+def apply_controlled_x_density(density, wires, control_value=1):
+    """Apply a multi-controlled X to the DensityMatrix by swapping entries.
+
+    A multi-controlled X is a permutation of the basis states: it flips the
+    target (the last wire) where all controls equal control_value. So
+    U rho U^dagger only swaps the two target halves of that block, first
+    along the row dims and then along the column dims, and no
+    2^k x 2^k matrix is built.
+
+    Args:
+        density (torch.Tensor): The densitymatrix.
+        wires (List[int]): The control wires followed by the target wire.
+        control_value (int, optional): The value of the controls for which
+            the target flips, 1 for multicnot and 0 for multixcnot.
+            Default to 1.
+
+    Returns:
+        torch.Tensor: The new densitymatrix.
+    """
+    n_qubit = int((density.dim() - 1) / 2)
+
+    new_density = density.clone()
+    for offset in [1, 1 + n_qubit]:
+        # view of the block where all controls equal control_value
+        block = new_density
+        for w in wires[:-1]:
+            block = block.narrow(w + offset, control_value, 1)
+        block.copy_(block.flip(wires[-1] + offset))
+
+    return new_density
+
+
+def apply_controlled_swap_density(density, wires):
+    """Apply a (controlled) swap to the DensityMatrix by relabeling dims.
+
+    A swap of two wires exchanges their dims on both the row and column
+    side, which for an uncontrolled swap is a single transpose copy, with
+    no matrix built. With controls, only the block where all controls are
+    1 is transposed.
+
+    Args:
+        density (torch.Tensor): The densitymatrix.
+        wires (List[int]): The control wires (if any) followed by the two
+            swapped wires.
+
+    Returns:
+        torch.Tensor: The new densitymatrix.
+    """
+    n_qubit = int((density.dim() - 1) / 2)
+    w0, w1 = wires[-2], wires[-1]
+
+    if len(wires) == 2:
+        # copied so that, like with the other apply functions, the result
+        # does not alias the input
+        return (
+            density.transpose(w0 + 1, w1 + 1)
+            .transpose(w0 + 1 + n_qubit, w1 + 1 + n_qubit)
+            .clone(memory_format=torch.contiguous_format)
+        )
+
+    new_density = density.clone()
+    for offset in [1, 1 + n_qubit]:
+        # view of the block where all controls are 1
+        block = new_density
+        for w in wires[:-2]:
+            block = block.narrow(w + offset, 1, 1)
+        block.copy_(block.transpose(w0 + offset, w1 + offset).clone())
+
     return new_density
 
 
+def _embed_matrix(mat, wires, target_wires):
+    """Extend a unitary on wires to a unitary on target_wires.
+
+    The unitary is padded with the identity on the wires of target_wires
+    it does not act on, then its axes are reordered to target_wires.
+
+    Args:
+        mat (torch.Tensor): The unitary, with or without a batch dim.
+        wires (List[int]): The wires of the unitary.
+        target_wires (List[int]): The wires of the result, a superset of
+            wires.
+
+    Returns:
+        torch.Tensor: The unitary on target_wires.
+    """
+    rest = [w for w in target_wires if w not in wires]
+    if rest:
+        mat = kron(
+            mat, torch.eye(2 ** len(rest), dtype=mat.dtype, device=mat.device)
+        )
+    order = list(wires) + rest
+    if order == list(target_wires):
+        return mat
+
+    n_target = len(target_wires)
+    lead = list(mat.shape[:-2])
+    n_lead = len(lead)
+    permutation = (
+        list(range(n_lead))
+        + [n_lead + order.index(w) for w in target_wires]
+        + [n_lead + n_target + order.index(w) for w in target_wires]
+    )
+    return (
+        mat.reshape(lead + [2] * 2 * n_target)
+        .permute(permutation)
+        .reshape(lead + [2**n_target, 2**n_target])
+    )
+
+
+def apply_unitary_density_bmm_many(density, mats, wires_list, max_fused_wires=4):
+    """Apply a sequence of unitaries to the DensityMatrix, fusing runs of
+    gates before touching the densitymatrix.
+
+    Consecutive gates acting on disjoint wires commute, so a run of them is
+    merged with kron into one unitary on the union of their wires. A gate
+    acting on exactly the wires of the pending unitary, such as rz after
+    ry after rx on one wire, is composed into it with a matmul. A gate
+    sharing only some wires with the pending unitary, such as rz on the
+    target after a cnot, is composed into it after both are extended to
+    the union of their wires with _embed_matrix. Each fused unitary is
+    applied with a single apply_unitary_density_bmm call instead of one
+    call per gate.
+
+    Args:
+        density (torch.Tensor): The densitymatrix.
+        mats (List[torch.Tensor]): The unitaries, in application order.
+        wires_list (List[Union[List[int], int]]): The wires of each unitary.
+        max_fused_wires (int, optional): The largest number of wires of a
+            fused unitary, past which the 2^k x 2^k matrix costs more than
+            the calls it saves. Default to 4.
+
+    Returns:
+        torch.Tensor: The new densitymatrix.
+    """
+    fused_mat = None
+    fused_wires = []
+
+    for mat, wires in zip(mats, wires_list):
+        wires = [wires] if isinstance(wires, int) else list(wires)
+        mat = mat.to(device=density.device, dtype=density.dtype)
+
+        if fused_mat is not None and wires == fused_wires:
+            fused_mat = torch.matmul(mat, fused_mat)
+            continue
+
+        if (
+            fused_mat is not None
+            and set(wires).isdisjoint(fused_wires)
+            and len(fused_wires) + len(wires) <= max_fused_wires
+        ):
+            fused_mat = kron(fused_mat, mat)
+            fused_wires = fused_wires + wires
+            continue
+
+        if fused_mat is not None:
+            union = fused_wires + [w for w in wires if w not in fused_wires]
+            if len(union) <= max_fused_wires:
+                fused_mat = torch.matmul(
+                    _embed_matrix(mat, wires, union),
+                    _embed_matrix(fused_mat, fused_wires, union),
+                )
+                fused_wires = union
+                continue
+
+        if fused_mat is not None:
+            density = apply_unitary_density_bmm(density, fused_mat, fused_wires)
+        fused_mat = mat
+        fused_wires = wires
+
+    if fused_mat is not None:
+        density = apply_unitary_density_bmm(density, fused_mat, fused_wires)
+
+    return density
+
+
+def apply_unitary_density_diagonal(density, diag, wires):
+    """Apply a diagonal unitary to the densitymatrix.
+
+    For a diagonal unitary D = diag(d), D rho D^dagger only rescales the
+    entries of rho by d on the row indices and conj(d) on the column
+    indices, so it is computed as an elementwise product instead of two
+    matrix multiplications.
+
+    Args:
+        density (torch.Tensor): The densitymatrix.
+        diag (torch.Tensor): The diagonal of the unitary, of shape
+            (2 ** len(wires),) or (bsz, 2 ** len(wires)).
+        wires (int or List[int]): Which qubit the operation is applied to.
+
+    Returns:
+        torch.Tensor: The new densitymatrix.
+    """
+    device_wires = wires
+    n_qubit = int((density.dim() - 1) / 2)
+    n_affected = len(device_wires)
+
+    diag = diag.to(device=density.device, dtype=density.dtype)
+    bsz = diag.shape[0] if diag.dim() > 1 else 1
+
+    # order the axes of the diagonal by wire so that a reshape inserting
+    # singleton dims puts each of them on the dim of its wire
+    order = sorted(range(n_affected), key=lambda k: device_wires[k])
+    diag = diag.reshape([bsz] + [2] * n_affected).permute(
+        [0] + [k + 1 for k in order]
+    )
+
+    left_shape = [bsz] + [1] * (2 * n_qubit)
+    right_shape = [bsz] + [1] * (2 * n_qubit)
+    for w in device_wires:
+        left_shape[w + 1] = 2
+        right_shape[w + 1 + n_qubit] = 2
+
+    # build the small d d^dagger factor first, then scale rho once
+    factor = diag.reshape(left_shape) * torch.conj(diag).reshape(right_shape)
+
+    return density * factor
+
+
+def apply_pauli_mask_density(density, x_mask=0, y_mask=0, z_mask=0):
+    """Apply a product of Pauli gates given as wire bitmasks to the
+    densitymatrix.
+
+    Bit w of a mask selects wire w. Conjugating rho by a Pauli string only
+    flips the row and column indices of the wires with an X or Y, and
+    negates the entries whose row and column bits differ on the wires with
+    a Y or Z. The whole string is therefore applied with one flip and one
+    elementwise product instead of one gate application per wire. Phases
+    such as the one of Y cancel in P rho P^dagger, so a wire set in several
+    masks acts as the product of its Paulis (e.g. X and Z give Y).
+
+    Args:
+        density (torch.Tensor): The densitymatrix.
+        x_mask (int, optional): The wires with a Pauli X. Default to 0.
+        y_mask (int, optional): The wires with a Pauli Y. Default to 0.
+        z_mask (int, optional): The wires with a Pauli Z. Default to 0.
+
+    Returns:
+        torch.Tensor: The new densitymatrix.
+    """
+    n_qubit = int((density.dim() - 1) / 2)
+    flip_mask = x_mask ^ y_mask
+    phase_mask = y_mask ^ z_mask
+
+    flip_dims = []
+    for w in range(n_qubit):
+        if flip_mask >> w & 1:
+            flip_dims += [w + 1, w + 1 + n_qubit]
+    if flip_dims:
+        density = torch.flip(density, flip_dims)
+
+    phase_wires = [w for w in range(n_qubit) if phase_mask >> w & 1]
+    if phase_wires:
+        # filled on the device, so that no host copy happens under CUDA
+        # graph capture
+        sign = torch.ones(2, dtype=density.dtype, device=density.device)
+        sign[1] = -1
+        factor = None
+        for w in phase_wires:
+            row_shape = [1] * (2 * n_qubit + 1)
+            col_shape = [1] * (2 * n_qubit + 1)
+            row_shape[w + 1] = 2
+            col_shape[w + 1 + n_qubit] = 2
+            wire_factor = sign.reshape(row_shape) * sign.reshape(col_shape)
+            factor = wire_factor if factor is None else factor * wire_factor
+        density = density * factor
+
+    return density
+
+
+# multi-controlled X gates, mapped to the control value flipping the target
+_controlled_x_gates = {"cnot": 1, "toffoli": 1, "multicnot": 1, "multixcnot": 0}
+
+# Pauli gates, mapped to the mask of apply_pauli_mask_density they set
+_pauli_mask_gates = {"paulix": 0, "pauliy": 1, "pauliz": 2}
+
+# gates whose params are the unitary itself
+_unitary_param_gates = {"qubitunitary", "qubitunitaryfast", "qubitunitarystrict"}
+
+# how gate_wrapper calls a matrix builder when n_wires is given; builders
+# not listed here only take the params
+_mat_builder_calls = {
+    # gates that can be applied to arbitrary numbers of qubits but no params
+    "multicnot": lambda mat, params, n_wires: mat(n_wires),
+    "multixcnot": lambda mat, params, n_wires: mat(n_wires),
+    # gates that can be applied to arbitrary numbers of qubits with params
+    "multirz": lambda mat, params, n_wires: mat(params, n_wires),
+}
+
+
+# rotation gates with U(theta)^dagger = U(-theta), inverted by negating
+# their params instead of transposing the built matrix
+_inverse_by_negation = {
+    "rx",
+    "ry",
+    "rz",
+    "rxx",
+    "ryy",
+    "rzz",
+    "rzx",
+    "crx",
+    "cry",
+    "crz",
+    "phaseshift",
+    "u1",
+    "cu1",
+    "multirz",
+}
+
+
+def _call_with_params(mat, params, n_wires):
+    return mat(params)
+
+
+def _normalize_params(name, params, device):
+    """Bring the params of a gate to the batched shape its builder takes.
+
+    A 1-D tensor is a batch of single angles, of shape (bsz,), and a 2-D
+    qubitunitary matrix is a batch of one.
+
+    Args:
+        name (str): The name of the gate.
+        params (Union[torch.Tensor, List, None]): The params of the gate.
+        device (torch.device): The device non-tensor params are built on.
+
+    Returns:
+        Optional[torch.Tensor]: The params, of shape (bsz, n_params) or
+            (bsz, 2^k, 2^k) for qubitunitary gates.
+    """
+    if params is None:
+        return None
+    if not isinstance(params, torch.Tensor):
+        # this is for qubitunitary gate, built on the device of the
+        # densitymatrix instead of being copied there afterwards
+        params = torch.tensor(params, dtype=C_DTYPE, device=device)
+
+    if name in _unitary_param_gates:
+        return params.unsqueeze(0) if params.dim() == 2 else params
+    return params.unsqueeze(-1) if params.dim() == 1 else params
+
+
+@functools.lru_cache(maxsize=256)
+def _const_matrix_on_device(name, dtype, device, inverse=False):
+    """Get the matrix of a non-parametric gate of mat_dict on a device.
+
+    The matrices in mat_dict live on the CPU, so they are copied to the
+    dtype and device of the densitymatrix once and reused afterwards
+    instead of being copied on every gate application. The inverse is
+    cached as well, as a contiguous conjugate transpose.
+
+    Args:
+        name (str): The name of the gate in mat_dict.
+        dtype (torch.dtype): The complex dtype of the densitymatrix.
+        device (torch.device): The device of the densitymatrix.
+        inverse (bool, optional): Whether to return the inverse of the
+            gate. Default to False.
+
+    Returns:
+        torch.Tensor: The matrix of the gate on the device.
+    """
+    matrix = mat_dict[name].to(device=device, dtype=dtype)
+    if inverse:
+        matrix = matrix.conj().transpose(-1, -2).contiguous()
+
+    return matrix
+
+
 def gate_wrapper(
     name,
     mat,
@@ -308,8 +825,8 @@ def gate_wrapper(
     Args:
         name (str): The name of the operation.
         mat (torch.Tensor): The unitary matrix of the gate.
-        method (str): 'bmm' or 'einsum' to compute matrix vector
-            multiplication.
+        method (str): 'bmm', 'einsum' or 'cuquantum' to compute matrix
+            vector multiplication.
         q_device (tq.QuantumDevice): The QuantumDevice.
         wires (Union[List[int], int]): Which qubit(s) to apply the gate.
         params (torch.Tensor, optional): Parameters (if any) of the gate.
@@ -328,15 +845,7 @@ def gate_wrapper(
         None.
     """
     
-    if params is not None:
-        if not isinstance(params, torch.Tensor):
-            # this is for qubitunitary gate
-            params = torch.tensor(params, dtype=C_DTYPE)
-
-        if name in ["qubitunitary", "qubitunitaryfast", "qubitunitarystrict"]:
-            params = params.unsqueeze(0) if params.dim() == 2 else params
-        else:
-            params = params.unsqueeze(-1) if params.dim() == 1 else params
+    params = _normalize_params(name, params, q_device.states.device)
     wires = [wires] if isinstance(wires, int) else wires
 
     if static:
@@ -352,24 +861,66 @@ def gate_wrapper(
         )
     else:
         # in dynamic mode, the function is computed instantly
+        if name in eigvals_dict:
+            # diagonal gates are applied from their diagonal only
+            if name == "multirz":
+                eigvals = eigvals_dict[name](
+                    params, n_wires if n_wires is not None else len(wires)
+                )
+            elif params is None:
+                # the cached constant already includes the inverse
+                eigvals = _const_eigvals_on_device(
+                    name, q_device.states.dtype, q_device.states.device, inverse
+                )
+                inverse = False
+            else:
+                eigvals = eigvals_dict[name](params)
+            if inverse:
+                eigvals = eigvals.conj()
+            q_device.states = apply_unitary_density_diagonal(
+                q_device.states, eigvals, wires
+            )
+            return
+
+        if name in _controlled_x_gates:
+            # permutation gates, which are their own inverse
+            q_device.states = apply_controlled_x_density(
+                q_device.states, wires, _controlled_x_gates[name]
+            )
+            return
+
+        if name in _pauli_mask_gates:
+            # Pauli gates only flip and negate entries, and are their own
+            # inverse
+            masks = [0, 0, 0]
+            masks[_pauli_mask_gates[name]] = 1 << wires[0]
+            q_device.states = apply_pauli_mask_density(q_device.states, *masks)
+            return
+
+        if name in ["swap", "cswap"]:
+            # permutation gates, which are their own inverse
+            q_device.states = apply_controlled_swap_density(q_device.states, wires)
+            return
+
         if isinstance(mat, Callable):
-            if n_wires is None or name in [
-                "qubitunitary",
-                "qubitunitaryfast",
-                "qubitunitarystrict",
-            ]:
+            if inverse and name in _inverse_by_negation:
+                params = -params
+                inverse = False
+            if _compiled_builders:
+                mat = _compiled_builders.get(mat, mat)
+            if n_wires is None:
                 matrix = mat(params)
-            elif name in ["multicnot", "multixcnot"]:
-                # this is for gates that can be applied to arbitrary numbers of
-                # qubits but no params, such as multicnot
-                matrix = mat(n_wires)
-            elif name in ["multirz"]:
-                # this is for gates that can be applied to arbitrary numbers of
-                # qubits such as multirz
-                matrix = mat(params, n_wires)
             else:
-                matrix = mat(params)
-
+                matrix = _mat_builder_calls.get(name, _call_with_params)(
+                    mat, params, n_wires
+                )
+
+        elif mat is mat_dict.get(name):
+            # the cached constant already includes the inverse
+            matrix = _const_matrix_on_device(
+                name, q_device.states.dtype, q_device.states.device, inverse
+            )
+            inverse = False
         else:
             matrix = mat
 
@@ -379,62 +930,94 @@ def gate_wrapper(
                 matrix = matrix.permute(0, 2, 1)
             else:
                 matrix = matrix.permute(1, 0)
-        print("Computing")
         state = q_device.states
         if method == "einsum":
             q_device.states = apply_unitary_density_einsum(state, matrix, wires)
         elif method == "bmm":
-            q_device.states = apply_unitary_density_bmm(state, matrix, wires)
+            if len(wires) == 1:
+                q_device.states = apply_unitary_density_single_wire(
+                    state, matrix, wires[0]
+                )
+            else:
+                q_device.states = apply_unitary_density_bmm(state, matrix, wires)
+        elif method == "cuquantum":
+            q_device.states = apply_unitary_density_cuquantum(state, matrix, wires)
 
 
 def reset(q_device: tq.QuantumDevice, wires, inverse=False) -> None:
     """Reset the target qubits to the state 0. It is a non-unitary operation.
 
+    The reset channel rho -> |0><0| rho |0><0| + |0><1| rho |1><0| is
+    applied to each target wire, so the trace and the reduced state of the
+    other wires are kept.
+
     Args:
         q_device (tq.QuantumDevice): The quantum device.
         wires (int or list): The target wire(s) to reset.
-        inverse (bool, optional): If True, performs an inverse reset operation. 
+        inverse (bool, optional): Has no effect, the reset channel has no
+            inverse. Kept for the signature shared with the gates.
             Defaults to False.
 
     Returns:
         None.
 
     Examples:
-        >>> device = tq.QuantumDevice(n_wires=3)
-        >>> reset(device, wires=1)
-        >>> print(device.states)
-        [1., 0., 1., 0., 0., 0., 0., 0.]
-
-        >>> reset(device, wires=[0, 2])
-        >>> print(device.states)
-        [0., 0., 0., 0., 0., 0., 0., 0.]
-    """
-    state = q_device.states
+        >>> qdev = tq.QuantumDevice(n_wires=1)
+        >>> qdev.states = torch.full((1, 2, 2), 0.5, dtype=C_DTYPE)
+        >>> reset(qdev, wires=0)
+        >>> print(qdev.states)
+        tensor([[[1.+0.j, 0.+0.j],
+                 [0.+0.j, 0.+0.j]]])
+    """
+    density = q_device.states
+    n_qubit = int((density.dim() - 1) / 2)
 
     wires = [wires] if isinstance(wires, int) else wires
 
     for wire in wires:
-        devices_dim = wire + 1
-        permute_to = list(range(state.dim()))
-        del permute_to[devices_dim]
-        permute_to += [devices_dim]
-        permute_back = list(np.argsort(permute_to))
+        row_dim = wire + 1
+        col_dim = wire + 1 + n_qubit
+
+        # the reset channel maps the (0, 0) block of the wire to the partial
+        # trace rho_00 + rho_11 and zeroes every other block, so the trace is
+        # kept and no normalization is needed
+        traced = density.narrow(row_dim, 0, 1).narrow(col_dim, 0, 1) + (
+            density.narrow(row_dim, 1, 1).narrow(col_dim, 1, 1)
+        )
+        new_density = torch.zeros_like(density)
+        new_density.narrow(row_dim, 0, 1).narrow(col_dim, 0, 1).copy_(traced)
+        density = new_density
 
-        # permute the target wire to the last dim
-        permuted = state.permute(permute_to)
+    q_device.states = density
 
-        # reset the state
-        permuted[..., 1] = 0
 
-        # permute back
-        state = state.permute(permute_back)
+def _matrix_2x2(m00, m01, m10, m11):
+    """Assemble a batch of 2x2 gate matrices from their entries.
 
-    # normalize the magnitude of states
-    q_device.states = normalize_statevector(q_device.states)
+    The output is allocated once and the entries are written into it, which
+    replaces the cat and stack of each row. Entries are tensors of shape
+    (bsz, 1) or Python scalars for the constant ones, so constants need no
+    allocation; at least one entry must be a tensor.
 
+    Args:
+        m00, m01, m10, m11 (Union[torch.Tensor, complex]): The entries.
 
-def rx_matrix(params: torch.Tensor) -> torch.Tensor:
-    """Compute unitary matrix for rx gate.
+    Returns:
+        torch.Tensor: The matrices, of shape (bsz, 2, 2).
+    """
+    like = next(m for m in (m00, m01, m10, m11) if isinstance(m, torch.Tensor))
+    matrix = torch.empty(like.shape[:-1] + (2, 2), dtype=C_DTYPE, device=like.device)
+    entries = ((0, 0, m00), (0, 1, m01), (1, 0, m10), (1, 1, m11))
+    for row, col, entry in entries:
+        if isinstance(entry, torch.Tensor):
+            entry = entry[..., 0]
+        matrix[..., row, col] = entry
+
+    return matrix
+
+
+def rx_matrix(params: torch.Tensor) -> torch.Tensor:
+    """Compute unitary matrix for rx gate.
 
     Args:
         params (torch.Tensor): The rotation angle.
@@ -458,9 +1041,7 @@ def rx_matrix(params: torch.Tensor) -> torch.Tensor:
     co = torch.cos(theta / 2)
     jsi = 1j * torch.sin(-theta / 2)
 
-    return torch.stack(
-        [torch.cat([co, jsi], dim=-1), torch.cat([jsi, co], dim=-1)], dim=-2
-    ).squeeze(0)
+    return _matrix_2x2(co, jsi, jsi, co)
 
 
 def ry_matrix(params: torch.Tensor) -> torch.Tensor:
@@ -478,9 +1059,7 @@ def ry_matrix(params: torch.Tensor) -> torch.Tensor:
     co = torch.cos(theta / 2)
     si = torch.sin(theta / 2)
 
-    return torch.stack(
-        [torch.cat([co, -si], dim=-1), torch.cat([si, co], dim=-1)], dim=-2
-    ).squeeze(0)
+    return _matrix_2x2(co, -si, si, co)
 
 
 def rz_matrix(params: torch.Tensor) -> torch.Tensor:
@@ -496,15 +1075,22 @@ def rz_matrix(params: torch.Tensor) -> torch.Tensor:
     theta = params.type(C_DTYPE)
     exp = torch.exp(-0.5j * theta)
 
-    return torch.stack(
-        [
-            torch.cat([exp, torch.zeros(exp.shape, device=params.device)], dim=-1),
-            torch.cat(
-                [torch.zeros(exp.shape, device=params.device), torch.conj(exp)], dim=-1
-            ),
-        ],
-        dim=-2,
-    ).squeeze(0)
+    return _matrix_2x2(exp, 0, 0, torch.conj(exp))
+
+
+def rz_eigvals(params):
+    """Compute eigenvalues for rz gate.
+
+    Args:
+        params (torch.Tensor): The rotation angle.
+
+    Returns:
+        torch.Tensor: The computed eigenvalues.
+    """
+    theta = params.type(C_DTYPE)
+    exp = torch.exp(-0.5j * theta)
+
+    return torch.cat([exp, torch.conj(exp)], dim=-1)
 
 
 def phaseshift_matrix(params):
@@ -528,19 +1114,22 @@ def phaseshift_matrix(params):
     phi = params.type(C_DTYPE)
     exp = torch.exp(1j * phi)
 
-    return torch.stack(
-        [
-            torch.cat(
-                [
-                    torch.ones(exp.shape, device=params.device),
-                    torch.zeros(exp.shape, device=params.device),
-                ],
-                dim=-1,
-            ),
-            torch.cat([torch.zeros(exp.shape, device=params.device), exp], dim=-1),
-        ],
-        dim=-2,
-    ).squeeze(0)
+    return _matrix_2x2(1, 0, 0, exp)
+
+
+def phaseshift_eigvals(params):
+    """Compute eigenvalues for phaseshift gate.
+
+    Args:
+        params (torch.Tensor): Input parameters.
+
+    Returns:
+        torch.Tensor: The computed eigenvalues.
+    """
+    phi = params.type(C_DTYPE)
+    exp = torch.exp(1j * phi)
+
+    return torch.cat([torch.ones_like(exp), exp], dim=-1)
 
 
 def rot_matrix(params):
@@ -553,32 +1142,42 @@ def rot_matrix(params):
         torch.Tensor: The computed unitary matrix.
     """
     
-    phi = params[:, 0].unsqueeze(dim=-1).type(C_DTYPE)
-    theta = params[:, 1].unsqueeze(dim=-1).type(C_DTYPE)
-    omega = params[:, 2].unsqueeze(dim=-1).type(C_DTYPE)
+    params = params.type(C_DTYPE)
+    phi = params[:, 0].unsqueeze(dim=-1)
+    theta = params[:, 1].unsqueeze(dim=-1)
+    omega = params[:, 2].unsqueeze(dim=-1)
 
     co = torch.cos(theta / 2)
     si = torch.sin(theta / 2)
 
-    return torch.stack(
-        [
-            torch.cat(
-                [
-                    torch.exp(-0.5j * (phi + omega)) * co,
-                    -torch.exp(0.5j * (phi - omega)) * si,
-                ],
-                dim=-1,
-            ),
-            torch.cat(
-                [
-                    torch.exp(-0.5j * (phi - omega)) * si,
-                    torch.exp(0.5j * (phi + omega)) * co,
-                ],
-                dim=-1,
-            ),
-        ],
-        dim=-2,
-    ).squeeze(0)
+    # the angles are real, so the second row phases are the conjugates of
+    # the first row ones
+    exp_sum = torch.exp(-0.5j * (phi + omega))
+    exp_diff = torch.exp(0.5j * (phi - omega))
+
+    return _matrix_2x2(
+        exp_sum * co,
+        -exp_diff * si,
+        torch.conj(exp_diff) * si,
+        torch.conj(exp_sum) * co,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _pauli_eigs_on_device(n_wires, device):
+    """Get the eigenvalues of Z x ... x Z on n_wires qubits on a device.
+
+    They only depend on the number of wires, so they are built and copied
+    to the device once instead of on every multirz application.
+
+    Args:
+        n_wires (int): The number of qubits.
+        device (torch.device): The device of the rotation angles.
+
+    Returns:
+        torch.Tensor: The +1/-1 eigenvalues, of shape (2 ** n_wires,).
+    """
+    return torch.tensor(pauli_eigs(n_wires)).to(device)
 
 
 def multirz_eigvals(params, n_wires):
@@ -593,7 +1192,7 @@ def multirz_eigvals(params, n_wires):
     
     theta = params.type(C_DTYPE)
     return torch.exp(
-        -1j * theta / 2 * torch.tensor(pauli_eigs(n_wires)).to(params.device)
+        -1j * theta / 2 * _pauli_eigs_on_device(n_wires, params.device)
     )
 
 
@@ -609,8 +1208,30 @@ def multirz_matrix(params, n_wires):
     
     # torch diagonal not available for complex number
     eigvals = multirz_eigvals(params, n_wires)
-    dia = diag(eigvals)
-    return dia.squeeze(0)
+    return diag(eigvals)
+
+
+def _identity_prefix_matrix(bsz, n_ones, device):
+    """Allocate a batch of 4x4 gate matrices to be filled in place.
+
+    The first n_ones diagonal entries are one, which covers the identity
+    block of the controlled gates, and all other entries are zero. This
+    replaces building the template from a nested Python list and repeating
+    it over the batch.
+
+    Args:
+        bsz (int): The batch size.
+        n_ones (int): The number of leading ones on the diagonal.
+        device (torch.device): The device of the matrices.
+
+    Returns:
+        torch.Tensor: The matrices, of shape (bsz, 4, 4).
+    """
+    matrix = torch.zeros((bsz, 4, 4), dtype=C_DTYPE, device=device)
+    if n_ones:
+        matrix.diagonal(dim1=-2, dim2=-1)[:, :n_ones] = 1
+
+    return matrix
 
 
 def rxx_matrix(params):
@@ -627,15 +1248,7 @@ def rxx_matrix(params):
     co = torch.cos(theta / 2)
     jsi = 1j * torch.sin(theta / 2)
 
-    matrix = (
-        torch.tensor(
-            [[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(co.shape[0], 1, 1)
-    )
+    matrix = _identity_prefix_matrix(co.shape[0], 0, params.device)
 
     matrix[:, 0, 0] = co[:, 0]
     matrix[:, 1, 1] = co[:, 0]
@@ -647,7 +1260,7 @@ def rxx_matrix(params):
     matrix[:, 2, 1] = -jsi[:, 0]
     matrix[:, 3, 0] = -jsi[:, 0]
 
-    return matrix.squeeze(0)
+    return matrix
 
 
 def ryy_matrix(params):
@@ -664,15 +1277,7 @@ def ryy_matrix(params):
     co = torch.cos(theta / 2)
     jsi = 1j * torch.sin(theta / 2)
 
-    matrix = (
-        torch.tensor(
-            [[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(co.shape[0], 1, 1)
-    )
+    matrix = _identity_prefix_matrix(co.shape[0], 0, params.device)
 
     matrix[:, 0, 0] = co[:, 0]
     matrix[:, 1, 1] = co[:, 0]
@@ -684,7 +1289,7 @@ def ryy_matrix(params):
     matrix[:, 2, 1] = -jsi[:, 0]
     matrix[:, 3, 0] = jsi[:, 0]
 
-    return matrix.squeeze(0)
+    return matrix
 
 
 def rzz_matrix(params):
@@ -701,22 +1306,14 @@ def rzz_matrix(params):
     exp = torch.exp(-0.5j * theta)
     conj_exp = torch.conj(exp)
 
-    matrix = (
-        torch.tensor(
-            [[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(exp.shape[0], 1, 1)
-    )
+    matrix = _identity_prefix_matrix(exp.shape[0], 0, params.device)
 
     matrix[:, 0, 0] = exp[:, 0]
     matrix[:, 1, 1] = conj_exp[:, 0]
     matrix[:, 2, 2] = conj_exp[:, 0]
     matrix[:, 3, 3] = exp[:, 0]
 
-    return matrix.squeeze(0)
+    return matrix
 
 
 def rzx_matrix(params):
@@ -733,15 +1330,7 @@ def rzx_matrix(params):
     co = torch.cos(theta / 2)
     jsi = 1j * torch.sin(theta / 2)
 
-    matrix = (
-        torch.tensor(
-            [[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(co.shape[0], 1, 1)
-    )
+    matrix = _identity_prefix_matrix(co.shape[0], 0, params.device)
 
     matrix[:, 0, 0] = co[:, 0]
     matrix[:, 0, 1] = -jsi[:, 0]
@@ -755,7 +1344,7 @@ def rzx_matrix(params):
     matrix[:, 3, 2] = jsi[:, 0]
     matrix[:, 3, 3] = co[:, 0]
 
-    return matrix.squeeze(0)
+    return matrix
 
 
 def crx_matrix(params):
@@ -772,21 +1361,13 @@ def crx_matrix(params):
     co = torch.cos(theta / 2)
     jsi = 1j * torch.sin(-theta / 2)
 
-    matrix = (
-        torch.tensor(
-            [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(co.shape[0], 1, 1)
-    )
+    matrix = _identity_prefix_matrix(co.shape[0], 2, params.device)
     matrix[:, 2, 2] = co[:, 0]
     matrix[:, 2, 3] = jsi[:, 0]
     matrix[:, 3, 2] = jsi[:, 0]
     matrix[:, 3, 3] = co[:, 0]
 
-    return matrix.squeeze(0)
+    return matrix
 
 
 def cry_matrix(params):
@@ -803,21 +1384,13 @@ def cry_matrix(params):
     co = torch.cos(theta / 2)
     si = torch.sin(theta / 2)
 
-    matrix = (
-        torch.tensor(
-            [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(co.shape[0], 1, 1)
-    )
+    matrix = _identity_prefix_matrix(co.shape[0], 2, params.device)
     matrix[:, 2, 2] = co[:, 0]
     matrix[:, 2, 3] = -si[:, 0]
     matrix[:, 3, 2] = si[:, 0]
     matrix[:, 3, 3] = co[:, 0]
 
-    return matrix.squeeze(0)
+    return matrix
 
 
 def crz_matrix(params):
@@ -833,19 +1406,27 @@ def crz_matrix(params):
     theta = params.type(C_DTYPE)
     exp = torch.exp(-0.5j * theta)
 
-    matrix = (
-        torch.tensor(
-            [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(exp.shape[0], 1, 1)
-    )
+    matrix = _identity_prefix_matrix(exp.shape[0], 2, params.device)
     matrix[:, 2, 2] = exp[:, 0]
     matrix[:, 3, 3] = torch.conj(exp[:, 0])
 
-    return matrix.squeeze(0)
+    return matrix
+
+
+def crz_eigvals(params):
+    """Compute eigenvalues for CRZ gate.
+
+    Args:
+        params (torch.Tensor): The rotation angle.
+
+    Returns:
+        torch.Tensor: The computed eigenvalues.
+    """
+    theta = params.type(C_DTYPE)
+    exp = torch.exp(-0.5j * theta)
+    ones = torch.ones_like(exp)
+
+    return torch.cat([ones, ones, exp, torch.conj(exp)], dim=-1)
 
 
 def crot_matrix(params):
@@ -858,29 +1439,22 @@ def crot_matrix(params):
         torch.Tensor: The computed unitary matrix.
     """
     
-    phi = params[:, 0].type(C_DTYPE)
-    theta = params[:, 1].type(C_DTYPE)
-    omega = params[:, 2].type(C_DTYPE)
+    params = params.type(C_DTYPE)
+    phi = params[:, 0]
+    theta = params[:, 1]
+    omega = params[:, 2]
 
     co = torch.cos(theta / 2)
     si = torch.sin(theta / 2)
 
-    matrix = (
-        torch.tensor(
-            [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(phi.shape[0], 1, 1)
-    )
+    matrix = _identity_prefix_matrix(phi.shape[0], 2, params.device)
 
     matrix[:, 2, 2] = torch.exp(-0.5j * (phi + omega)) * co
     matrix[:, 2, 3] = -torch.exp(0.5j * (phi - omega)) * si
     matrix[:, 3, 2] = torch.exp(-0.5j * (phi - omega)) * si
     matrix[:, 3, 3] = torch.exp(0.5j * (phi + omega)) * co
 
-    return matrix.squeeze(0)
+    return matrix
 
 
 def u1_matrix(params):
@@ -896,19 +1470,7 @@ def u1_matrix(params):
     phi = params.type(C_DTYPE)
     exp = torch.exp(1j * phi)
 
-    return torch.stack(
-        [
-            torch.cat(
-                [
-                    torch.ones(exp.shape, device=params.device),
-                    torch.zeros(exp.shape, device=params.device),
-                ],
-                dim=-1,
-            ),
-            torch.cat([torch.zeros(exp.shape, device=params.device), exp], dim=-1),
-        ],
-        dim=-2,
-    ).squeeze(0)
+    return _matrix_2x2(1, 0, 0, exp)
 
 
 def cu1_matrix(params):
@@ -924,19 +1486,27 @@ def cu1_matrix(params):
     phi = params.type(C_DTYPE)
     exp = torch.exp(1j * phi)
 
-    matrix = (
-        torch.tensor(
-            [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(phi.shape[0], 1, 1)
-    )
+    matrix = _identity_prefix_matrix(phi.shape[0], 3, params.device)
+
+    matrix[:, 3, 3] = exp[:, 0]
+
+    return matrix
+
+
+def cu1_eigvals(params):
+    """Compute eigenvalues for CU1 gate.
 
-    matrix[:, 3, 3] = exp
+    Args:
+        params (torch.Tensor): The rotation angle.
+
+    Returns:
+        torch.Tensor: The computed eigenvalues.
+    """
+    phi = params.type(C_DTYPE)
+    exp = torch.exp(1j * phi)
+    ones = torch.ones_like(exp)
 
-    return matrix.squeeze(0)
+    return torch.cat([ones, ones, ones, exp], dim=-1)
 
 
 def u2_matrix(params):
@@ -949,19 +1519,14 @@ def u2_matrix(params):
         torch.Tensor: The computed unitary matrix.
     """
     
-    phi = params[:, 0].unsqueeze(dim=-1).type(C_DTYPE)
-    lam = params[:, 1].unsqueeze(dim=-1).type(C_DTYPE)
+    params = params.type(C_DTYPE)
+    phi = params[:, 0].unsqueeze(dim=-1)
+    lam = params[:, 1].unsqueeze(dim=-1)
 
-    return INV_SQRT2 * torch.stack(
-        [
-            torch.cat(
-                [torch.ones(phi.shape, device=params.device), -torch.exp(1j * lam)],
-                dim=-1,
-            ),
-            torch.cat([torch.exp(1j * phi), torch.exp(1j * (phi + lam))], dim=-1),
-        ],
-        dim=-2,
-    ).squeeze(0)
+    exp_phi = torch.exp(1j * phi)
+    exp_lam = torch.exp(1j * lam)
+
+    return INV_SQRT2 * _matrix_2x2(1, -exp_lam, exp_phi, exp_phi * exp_lam)
 
 
 def cu2_matrix(params):
@@ -974,24 +1539,17 @@ def cu2_matrix(params):
         torch.Tensor: The computed unitary matrix.
     """
     
-    phi = params[:, 0].unsqueeze(dim=-1).type(C_DTYPE)
-    lam = params[:, 1].unsqueeze(dim=-1).type(C_DTYPE)
-
-    matrix = (
-        torch.tensor(
-            [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(phi.shape[0], 1, 1)
-    )
+    params = params.type(C_DTYPE)
+    phi = params[:, 0].unsqueeze(dim=-1)
+    lam = params[:, 1].unsqueeze(dim=-1)
+
+    matrix = _identity_prefix_matrix(phi.shape[0], 3, params.device)
 
-    matrix[:, 2, 3] = -torch.exp(1j * lam)
-    matrix[:, 3, 2] = torch.exp(1j * phi)
-    matrix[:, 3, 3] = torch.exp(1j * (phi + lam))
+    matrix[:, 2, 3] = -torch.exp(1j * lam[:, 0])
+    matrix[:, 3, 2] = torch.exp(1j * phi[:, 0])
+    matrix[:, 3, 3] = torch.exp(1j * (phi[:, 0] + lam[:, 0]))
 
-    return matrix.squeeze(0)
+    return matrix
 
 
 def u3_matrix(params):
@@ -1004,22 +1562,18 @@ def u3_matrix(params):
         torch.Tensor: The computed unitary matrix.
     """
     
-    theta = params[:, 0].unsqueeze(dim=-1).type(C_DTYPE)
-    phi = params[:, 1].unsqueeze(dim=-1).type(C_DTYPE)
-    lam = params[:, 2].unsqueeze(dim=-1).type(C_DTYPE)
+    params = params.type(C_DTYPE)
+    theta = params[:, 0].unsqueeze(dim=-1)
+    phi = params[:, 1].unsqueeze(dim=-1)
+    lam = params[:, 2].unsqueeze(dim=-1)
 
     co = torch.cos(theta / 2)
     si = torch.sin(theta / 2)
 
-    return torch.stack(
-        [
-            torch.cat([co, -si * torch.exp(1j * lam)], dim=-1),
-            torch.cat(
-                [si * torch.exp(1j * phi), co * torch.exp(1j * (phi + lam))], dim=-1
-            ),
-        ],
-        dim=-2,
-    ).squeeze(0)
+    exp_phi = torch.exp(1j * phi)
+    exp_lam = torch.exp(1j * lam)
+
+    return _matrix_2x2(co, -si * exp_lam, si * exp_phi, co * exp_phi * exp_lam)
 
 
 def cu3_matrix(params):
@@ -1032,29 +1586,22 @@ def cu3_matrix(params):
         torch.Tensor: The computed unitary matrix.
     """
     
-    theta = params[:, 0].unsqueeze(dim=-1).type(C_DTYPE)
-    phi = params[:, 1].unsqueeze(dim=-1).type(C_DTYPE)
-    lam = params[:, 2].unsqueeze(dim=-1).type(C_DTYPE)
+    params = params.type(C_DTYPE)
+    theta = params[:, 0].unsqueeze(dim=-1)
+    phi = params[:, 1].unsqueeze(dim=-1)
+    lam = params[:, 2].unsqueeze(dim=-1)
 
     co = torch.cos(theta / 2)
     si = torch.sin(theta / 2)
 
-    matrix = (
-        torch.tensor(
-            [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(phi.shape[0], 1, 1)
-    )
+    matrix = _identity_prefix_matrix(phi.shape[0], 2, params.device)
 
-    matrix[:, 2, 2] = co
-    matrix[:, 2, 3] = -si * torch.exp(1j * lam)
-    matrix[:, 3, 2] = si * torch.exp(1j * phi)
-    matrix[:, 3, 3] = co * torch.exp(1j * (phi + lam))
+    matrix[:, 2, 2] = co[:, 0]
+    matrix[:, 2, 3] = -si[:, 0] * torch.exp(1j * lam[:, 0])
+    matrix[:, 3, 2] = si[:, 0] * torch.exp(1j * phi[:, 0])
+    matrix[:, 3, 3] = co[:, 0] * torch.exp(1j * (phi[:, 0] + lam[:, 0]))
 
-    return matrix.squeeze(0)
+    return matrix
 
 
 def kron(a, b):
@@ -1067,10 +1614,38 @@ def kron(a, b):
     :type b: torch.Tensor
     :rtype: torch.Tensor
     """
-    siz1 = torch.Size(torch.tensor(a.shape[-2:]) * torch.tensor(b.shape[-2:]))
-    res = a.unsqueeze(-1).unsqueeze(-3) * b.unsqueeze(-2).unsqueeze(-4)
-    siz0 = res.shape[:-4]
-    return res.reshape(siz0 + siz1)
+    if a.dim() == 2 and b.dim() == 2:
+        # torch.kron views its inputs, which fails for transposed ones such
+        # as the Q of a QR decomposition
+        return torch.kron(a.contiguous(), b.contiguous())
+
+    # one broadcast multiply producing the (row_a, row_b, col_a, col_b)
+    # layout, which for small factors is cheaper than an einsum dispatch
+    res = a[..., :, None, :, None] * b[..., None, :, None, :]
+    siz1 = (a.shape[-2] * b.shape[-2], a.shape[-1] * b.shape[-1])
+    return res.reshape(res.shape[:-4] + siz1)
+
+
+def _kron_bmm(a, b, matrix):
+    """Compute torch.bmm(kron(a, b), matrix) without building kron(a, b).
+
+    The rows of matrix are split into the two qubit indices, which a and b
+    contract separately.
+
+    Args:
+        a (torch.Tensor): The factor on the first qubit, of shape (bsz, 2, 2).
+        b (torch.Tensor): The factor on the second qubit, of shape
+            (bsz, 2, 2).
+        matrix (torch.Tensor): The right operand, of shape (bsz, 4, n).
+
+    Returns:
+        torch.Tensor: The product, of shape (bsz, 4, n).
+    """
+    bsz = matrix.shape[0]
+    res = torch.einsum(
+        "bij,bkl,bjln->bikn", a, b, matrix.reshape(bsz, 2, 2, -1)
+    )
+    return res.reshape(bsz, 4, -1)
 
 
 def su4_matrix(params):
@@ -1088,124 +1663,74 @@ def su4_matrix(params):
         torch.Tensor: The computed unitary matrix.
     """
     bsz = params.shape[0]
-    zero = torch.zeros((bsz,1))
-    one = torch.ones((bsz,1))
-
-    # rotation angle for first Rz
-    theta = params[:, 0].unsqueeze(dim=-1).type(C_DTYPE)
-
-    # rotation angle for Rx
-    phi = params[:, 1].unsqueeze(dim=-1).type(C_DTYPE)
-    cos_of_phi = torch.cos(phi / 2)
-    sin_of_phi = torch.sin(phi / 2)
-
-    # rotation angle for second Rz
-    lam = params[:, 2].unsqueeze(dim=-1).type(C_DTYPE)
-
-    # SU(2) angles for gate a
-    alpha1 = params[:, 3].unsqueeze(dim=-1).type(C_DTYPE)
-    alpha2 = params[:, 4].unsqueeze(dim=-1).type(C_DTYPE)
-    alpha3 = params[:, 5].unsqueeze(dim=-1).type(C_DTYPE)
-    cos_of_alpha1 = torch.cos(alpha1 / 2)
-    sin_of_alpha1 = torch.sin(alpha1 / 2)
-
-    # SU(2) angles for gate b
-    beta1 = params[:, 6].unsqueeze(dim=-1).type(C_DTYPE)
-    beta2 = params[:, 7].unsqueeze(dim=-1).type(C_DTYPE)
-    beta3 = params[:, 8].unsqueeze(dim=-1).type(C_DTYPE)
-    cos_of_beta1 = torch.cos(beta1 / 2)
-    sin_of_beta1 = torch.sin(beta1 / 2)
-
-    # SU(2) angles for gate c
-    gamma1 = params[:, 9].unsqueeze(dim=-1).type(C_DTYPE)
-    gamma2 = params[:, 10].unsqueeze(dim=-1).type(C_DTYPE)
-    gamma3 = params[:, 11].unsqueeze(dim=-1).type(C_DTYPE)
-    cos_of_gamma1 = torch.cos(gamma1 / 2)
-    sin_of_gamma1 = torch.sin(gamma1 / 2)
-
-    # SU(2) angles for gate d
-    delta1 = params[:, 12].unsqueeze(dim=-1).type(C_DTYPE)
-    delta2 = params[:, 13].unsqueeze(dim=-1).type(C_DTYPE)
-    delta3 = params[:, 14].unsqueeze(dim=-1).type(C_DTYPE)
-    cos_of_delta1 = torch.cos(delta1 / 2)
-    sin_of_delta1 = torch.sin(delta1 / 2)
-
-    # Construct all one-qubit gates needed
-    iden = torch.eye(2).repeat(bsz, 1, 1)
-
-    rz1 = torch.stack(
-        [
-            torch.cat([torch.exp(-1j * theta / 2), zero], dim=-1),
-            torch.cat([zero, torch.exp(1j * theta / 2)], dim=-1),
-        ],
-        dim=-2,
-    )
-
-    rz2 = torch.stack(
-        [
-            torch.cat([torch.exp(-1j * lam / 2), zero], dim=-1),
-            torch.cat([zero, torch.exp(1j * lam / 2)], dim=-1),
-        ],
-        dim=-2,
-    )
-
-    rx1 = torch.stack(
-        [
-            torch.cat([cos_of_phi, -1j * sin_of_phi], dim=-1),
-            torch.cat([-1j * sin_of_phi, cos_of_phi], dim=-1),
-        ],
-        dim=-2,
-    )
-
-    a_su2 = torch.stack(
-        [
-            torch.cat([cos_of_alpha1, -1 * torch.exp(1j * alpha3) * sin_of_alpha1], dim=-1),
-            torch.cat([torch.exp(1j * alpha2) * sin_of_alpha1, torch.exp(1j * (alpha2 + alpha3)) * cos_of_alpha1], dim=-1),
-        ],
-        dim=-2,
-    )
-
-    b_su2 = torch.stack(
-        [
-            torch.cat([cos_of_beta1, -1 * torch.exp(1j * beta3) * sin_of_beta1], dim=-1),
-            torch.cat([torch.exp(1j * beta2) * sin_of_beta1, torch.exp(1j * (beta2 + beta3)) * cos_of_beta1], dim=-1),
-        ],
-        dim=-2,
-    )
-
-    c_su2 = torch.stack(
-        [
-            torch.cat([cos_of_gamma1, -1 * torch.exp(1j * gamma3) * sin_of_gamma1], dim=-1),
-            torch.cat([torch.exp(1j * gamma2) * sin_of_gamma1, torch.exp(1j * (gamma2 + gamma3)) * cos_of_gamma1], dim=-1),
-        ],
-        dim=-2,
+    params = params.type(C_DTYPE)
+
+    # cos and sin of all the half angles in one call each: the angle of Rx,
+    # then the first SU(2) angle of the gates a, b, c and d
+    # torch.polar gives cos + i sin of the (real) angles in a single call
+    half_angles = torch.real(params[:, [1, 3, 6, 9, 12]]) / 2
+    sincos_half = torch.polar(torch.ones_like(half_angles), half_angles)
+    cos_half = sincos_half.real
+    sin_half = sincos_half.imag
+
+    # all the phases in one call: the two Rz (angles 0 and 2), then the
+    # second and third SU(2) angles of the gates a, b, c and d
+    phases = torch.exp(
+        1j
+        * torch.cat(
+            [-params[:, [0, 2]] / 2, params[:, [4, 5, 7, 8, 10, 11, 13, 14]]],
+            dim=-1,
+        )
     )
+    rz_phase = phases[:, :2]
+    su2_phase2 = phases[:, 2::2]
+    su2_phase3 = phases[:, 3::2]
 
-    d_su2 = torch.stack(
-        [
-            torch.cat([cos_of_delta1, -1 * torch.exp(1j * delta3) * sin_of_delta1], dim=-1),
-            torch.cat([torch.exp(1j * delta2) * sin_of_delta1, torch.exp(1j * (delta2 + delta3)) * cos_of_delta1], dim=-1),
-        ],
-        dim=-2,
+    # Construct all one-qubit gates needed
+    # the angles are real, so exp(1j * theta / 2) is the conjugate of
+    # exp(-1j * theta / 2). Only the diagonal of the first Rz is needed.
+    rz1_diag = torch.stack([rz_phase[:, 0], torch.conj(rz_phase[:, 0])], dim=-1)
+    rz2 = torch.zeros((bsz, 2, 2), dtype=C_DTYPE, device=params.device)
+    rz2[:, 0, 0] = rz_phase[:, 1]
+    rz2[:, 1, 1] = torch.conj(rz_phase[:, 1])
+
+    cos_of_phi = cos_half[:, 0]
+    jsin_of_phi = -1j * sin_half[:, 0]
+    rx1 = torch.empty((bsz, 2, 2), dtype=C_DTYPE, device=params.device)
+    rx1[:, 0, 0] = cos_of_phi
+    rx1[:, 0, 1] = jsin_of_phi
+    rx1[:, 1, 0] = jsin_of_phi
+    rx1[:, 1, 1] = cos_of_phi
+
+    co = cos_half[:, 1:]
+    si = sin_half[:, 1:]
+    a_su2, b_su2, c_su2, d_su2 = (
+        torch.stack(
+            [
+                co,
+                -su2_phase3 * si,
+                su2_phase2 * si,
+                su2_phase2 * su2_phase3 * co,
+            ],
+            dim=-1,
+        )
+        .view(bsz, 4, 2, 2)
+        .unbind(1)
     )
 
-    # Construct two-qubit CNOT
-    cnot = torch.stack(
-        [
-            torch.cat([one, zero, zero, zero], dim=-1),
-            torch.cat([zero, one, zero, zero], dim=-1),
-            torch.cat([zero, zero, zero, one], dim=-1),
-            torch.cat([zero, zero, one, zero], dim=-1),
-        ],
-        dim=-2,
-    ).type(C_DTYPE)
+    # The two-qubit CNOT only swaps the basis states |10> and |11>, so
+    # multiplying a matrix by it from the left is a gather of its rows
+    cnot_perm = [0, 1, 3, 2]
 
-    matrix = torch.bmm(cnot, kron(iden, rz1))
-    matrix = torch.bmm(kron(c_su2, d_su2), matrix)
-    matrix = torch.bmm(cnot, matrix)
-    matrix = torch.bmm(kron(rx1, rz2), matrix)
-    matrix = torch.bmm(cnot, matrix)
-    return torch.bmm(kron(a_su2, b_su2), matrix).squeeze(0)
+    # CNOT (I x rz1) is a permutation followed by a diagonal, so
+    # multiplying c x d by it only gathers and scales its columns and the
+    # first layer needs no 4x4 product
+    # (I x rz1) has the diagonal of rz1 repeated for both states of qubit 0
+    iden_rz1_diag = rz1_diag.repeat(1, 2).unsqueeze(-2)
+    matrix = kron(c_su2, d_su2)[:, :, cnot_perm] * iden_rz1_diag
+    matrix = matrix[:, cnot_perm]
+    matrix = _kron_bmm(rx1, rz2, matrix)[:, cnot_perm]
+    return _kron_bmm(a_su2, b_su2, matrix)
 
 
 def qubitunitary_matrix(params):
@@ -1216,37 +1741,21 @@ def qubitunitary_matrix(params):
 
     Returns:
         torch.Tensor: The computed unitary matrix.
-        
+
     Raises:
-        AssertionError: If Operator is other than square matrix
+        ValueError: If the matrix is not square or not unitary.
     """
-    
-    matrix = params.squeeze(0)
-    try:
-        assert matrix.shape[-1] == matrix.shape[-2]
-    except AssertionError as err:
-        logger.exception(f"Operator must be a square matrix.")
-        raise err
-
-    try:
-        U = matrix.cpu().detach().numpy()
-        if matrix.dim() > 2:
-            # batched unitary
-            bsz = matrix.shape[0]
-            assert np.allclose(
-                np.matmul(U, np.transpose(U.conj(), [0, 2, 1])),
-                np.stack([np.identity(U.shape[-1])] * bsz),
-                atol=1e-5,
-            )
-        else:
-            assert np.allclose(
-                np.matmul(U, np.transpose(U.conj(), [1, 0])),
-                np.identity(U.shape[0]),
-                atol=1e-5,
-            )
-    except AssertionError as err:
-        logger.exception(f"Operator must be unitary.")
-        raise err
+    matrix = params
+    if matrix.shape[-1] != matrix.shape[-2]:
+        raise ValueError("Operator must be a square matrix.")
+
+    # checked on the device of the matrix, only the result is synced
+    U = matrix.detach()
+    identity = torch.eye(U.shape[-1], dtype=U.dtype, device=U.device)
+    if not torch.allclose(
+        torch.matmul(U, U.conj().transpose(-1, -2)), identity, atol=1e-5
+    ):
+        raise ValueError("Operator must be unitary.")
 
     return matrix
 
@@ -1261,24 +1770,52 @@ def qubitunitaryfast_matrix(params):
         torch.Tensor: The computed unitary matrix.
     """
     
-    return params.squeeze(0)
+    return params
+
+
+# projected unitaries of qubitunitarystrict, keyed by the id of the params
+# tensor and valid while its version counter is unchanged. Tensors cannot
+# be dict keys themselves (their __eq__ is elementwise), so each entry is
+# evicted by a weakref.finalize when its tensor is freed, before the id can
+# be reused
+_strict_unitary_cache = {}
 
 
 def qubitunitarystrict_matrix(params):
     """Compute unitary matrix for Qubitunitary strict gate.
         Strictly be the unitary.
 
+    The SVD projection is cached for params that are not tracked by
+    autograd, such as fixed unitaries or inference, and reused until the
+    params are modified in place.
+
     Args:
         params (torch.Tensor): The unitary matrix.
 
     Returns:
         torch.Tensor: The computed unitary matrix.
     """
-    
-    params.squeeze(0)
-    mat = params
-    U, Sigma, V = torch.svd(mat)
-    return U.matmul(V)
+    # views such as the unsqueeze in gate_wrapper share the version counter
+    # of their base, so the base is the cache key and the view is told
+    # apart by its data pointer and shape
+    base = params if params._base is None else params._base
+    stamp = (params._version, params.data_ptr(), params.shape)
+    cacheable = not (params.requires_grad and torch.is_grad_enabled())
+    if cacheable:
+        cached = _strict_unitary_cache.get(id(base))
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+    U, _, Vh = torch.linalg.svd(params, full_matrices=False)
+    # U Vh is the unitary polar factor, the closest unitary to mat
+    matrix = U.matmul(Vh)
+
+    if cacheable:
+        if id(base) not in _strict_unitary_cache:
+            weakref.finalize(base, _strict_unitary_cache.pop, id(base), None)
+        _strict_unitary_cache[id(base)] = (stamp, matrix)
+
+    return matrix
 
 
 def multicnot_matrix(n_wires):
@@ -1330,28 +1867,28 @@ def single_excitation_matrix(params):
         torch.Tensor: The computed unitary matrix.
     """
     
-    theta = params.type(C_DTYPE)
-    co = torch.cos(theta / 2)
-    si = torch.sin(theta / 2)
+    # torch.polar gives cos + i sin of the (real) angle in a single call
+    half_theta = torch.real(params) / 2
+    sincos_half = torch.polar(torch.ones_like(half_theta), half_theta)
+    co = sincos_half.real[:, 0]
+    si = sincos_half.imag[:, 0]
 
-    matrix = (
-        torch.tensor(
-            [[1, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 1]],
-            dtype=C_DTYPE,
-            device=params.device,
-        )
-        .unsqueeze(0)
-        .repeat(theta.shape[0], 1, 1)
+    matrix = torch.zeros(
+        (params.shape[0], 4, 4), dtype=C_DTYPE, device=params.device
     )
-
+    matrix[:, 0, 0] = 1
     matrix[:, 1, 1] = co
     matrix[:, 1, 2] = -si
     matrix[:, 2, 1] = si
     matrix[:, 2, 2] = co
+    matrix[:, 3, 3] = 1
 
-    return matrix.squeeze(0)
+    return matrix
 
 
+# The builders of the parametric gates return a batch of matrices of shape
+# (bsz, d, d), also for a batch of one, and the *_eigvals a batch of
+# diagonals of shape (bsz, d). The constant gates are plain (d, d) matrices.
 mat_dict = {
     "hadamard": torch.tensor(
         [[INV_SQRT2, INV_SQRT2], [INV_SQRT2, -INV_SQRT2]], dtype=C_DTYPE
@@ -1446,1992 +1983,557 @@ mat_dict = {
     "single_excitation": single_excitation_matrix,
 }
 
+@functools.lru_cache(maxsize=256)
+def _const_eigvals_on_device(name, dtype, device, inverse=False):
+    """Get the diagonal of a non-parametric diagonal gate on a device.
 
-def hadamard(
-    q_device: tq.QuantumDevice,
-    wires: Union[List[int], int],
-    params: torch.Tensor = None,
-    n_wires: int = None,
-    static: bool = False,
-    parent_graph=None,
-    inverse: bool = False,
-    comp_method: str = "bmm",
-):
-    """Perform the hadamard gate.
+    Cached like _const_matrix_on_device, so the diagonal is not copied to
+    the device of the densitymatrix on every gate application.
 
     Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        name (str): The name of the gate in mat_dict.
+        dtype (torch.dtype): The complex dtype of the densitymatrix.
+        device (torch.device): The device of the densitymatrix.
+        inverse (bool, optional): Whether to return the diagonal of the
+            inverse of the gate. Default to False.
 
     Returns:
-        None.
+        torch.Tensor: The diagonal of the gate on the device.
     """
-    
-    name = "hadamard"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
+    matrix = _const_matrix_on_device(name, dtype, device, inverse)
 
+    return torch.diagonal(matrix).contiguous()
 
-def shadamard(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the shadamard gate.
+
+def _const_eigvals(name):
+    """Get the function returning the diagonal of a diagonal gate of mat_dict.
 
     Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        name (str): The name of the gate in mat_dict.
 
     Returns:
-        None.
+        Callable: The function of the params (unused) returning the diagonal.
     """
-    
-    name = "shadamard"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
+    return lambda params: _const_eigvals_on_device(
+        name, C_DTYPE, torch.device("cpu")
     )
 
 
-def paulix(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the Pauli X gate.
+# Gates whose unitary is diagonal, mapped to the function computing the
+# diagonal. gate_wrapper applies them elementwise instead of with mat_dict.
+eigvals_dict = {
+    "pauliz": _const_eigvals("pauliz"),
+    "s": _const_eigvals("s"),
+    "t": _const_eigvals("t"),
+    "cz": _const_eigvals("cz"),
+    "rz": rz_eigvals,
+    "phaseshift": phaseshift_eigvals,
+    "multirz": multirz_eigvals,
+    "crz": crz_eigvals,
+    "u1": phaseshift_eigvals,
+    "cu1": cu1_eigvals,
+}
+
+# torch.compile'd matrix builders, keyed by the eager builder of mat_dict
+_compiled_builders = {}
+
+
+def compile_matrix_builders(names=None, **compile_kwargs):
+    """Compile matrix builders of mat_dict with torch.compile (requires
+    torch>=2.0).
+
+    Builders like su4_matrix are a fixed chain of small tensor ops, which
+    the compiler can fuse into a few kernels. gate_wrapper uses the
+    compiled builders from then on. The gain is limited with complex
+    dtypes: Inductor does not generate code for complex ops, which most
+    builders are made of, so the compiled builders may be no faster than
+    the eager ones. This is opt-in because the first call of each builder
+    pays the compilation time.
 
     Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        names (Tuple[str], optional): The names of the gates in mat_dict
+            whose builders are compiled. Default to None, which compiles
+            every builder except the qubitunitary ones, whose data
+            dependent checks and caching break the graph.
+        **compile_kwargs: Passed to torch.compile, dynamic defaults to True
+            so that a change of batch size does not recompile.
 
     Returns:
         None.
     """
-    
-    name = "paulix"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def pauliy(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the Pauli Y gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "pauliy"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def pauliz(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the Pauli Z gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "pauliz"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def i(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the I gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "i"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def s(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the s gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "s"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def t(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the t gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "t"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def sx(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the sx gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "sx"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def cnot(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the cnot gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "cnot"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def cz(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the cz gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "cz"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def cy(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the cy gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "cy"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def rx(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the rx gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "rx"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def ry(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the ry gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "ry"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def rz(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the rz gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "rz"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def rxx(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the rxx gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "rxx"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def ryy(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the ryy gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "ryy"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def rzz(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the rzz gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "rzz"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def rzx(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the rzx gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "rzx"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def swap(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the swap gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "swap"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def sswap(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the sswap gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "sswap"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def cswap(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the cswap gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "cswap"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def toffoli(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the toffoli gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "toffoli"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def phaseshift(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the phaseshift gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "phaseshift"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def rot(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the rot gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "rot"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def multirz(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the multi qubit RZ gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "multirz"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def crx(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the crx gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "crx"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def cry(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the cry gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "cry"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def crz(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the crz gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "crz"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def crot(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the crot gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "crot"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def u1(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the u1 gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "u1"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
-
-
-def u2(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the u2 gate.
-
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
-
-    Returns:
-        None.
-    """
-    
-    name = "u2"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
+    compile_kwargs.setdefault("dynamic", True)
+    if names is None:
+        names = [
+            name
+            for name, builder in mat_dict.items()
+            if callable(builder) and name not in _unitary_param_gates
+        ]
+    for name in names:
+        builder = mat_dict[name]
+        _compiled_builders[builder] = torch.compile(builder, **compile_kwargs)
 
 
-def u3(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the u3 gate.
+def gate_matrices_many(name, params_list, n_wires=None):
+    """Build the matrices of several applications of one parametric gate.
 
-    Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+    The parameters of all applications are concatenated along the batch
+    dim so that the cos/sin/exp of the builder run once for all of them,
+    then the result is split back per application. Used together with
+    apply_unitary_density_bmm_many to run a circuit from precomputed
+    matrices.
+
+    Args:
+        name (str): The name of the gate in mat_dict.
+        params_list (List[torch.Tensor]): The parameters of each
+            application, normalized as in gate_wrapper: of shape
+            (bsz, n_params), (bsz,) for a batch of single angles, or the
+            (bsz, 2^k, 2^k) or (2^k, 2^k) matrix of qubitunitary gates.
+            None for gates without params, e.g. multicnot.
+        n_wires (int, optional): Number of qubits the gate is applied to,
+            passed to the builders of multicnot, multixcnot and multirz as
+            in gate_wrapper. Required for these gates. Default to None.
 
     Returns:
-        None.
+        List[torch.Tensor]: The matrix of each application, of shape
+            (bsz, 2^k, 2^k), or (2^k, 2^k) for gates without params.
     """
-    
-    name = "u3"
+    if name in _mat_builder_calls and n_wires is None:
+        raise ValueError(f"{name} needs n_wires to build its matrix.")
+
     mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
+    if _compiled_builders:
+        mat = _compiled_builders.get(mat, mat)
 
+    if any(params is None for params in params_list):
+        params = None
+    else:
+        params_list = [
+            _normalize_params(name, params, None) for params in params_list
+        ]
+        if name in _unitary_param_gates:
+            # nothing to share between the matrices, which may also differ
+            # in size
+            return [mat(params) for params in params_list]
+        params = torch.cat(params_list, dim=0)
+
+    if n_wires is None:
+        matrices = mat(params)
+    else:
+        matrices = _mat_builder_calls.get(name, _call_with_params)(
+            mat, params, n_wires
+        )
+    if matrices.dim() == 2:
+        # gates without params, e.g. multicnot, build one matrix shared by
+        # all applications
+        return [matrices] * len(params_list)
 
-def cu1(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the cu1 gate.
+    return list(matrices.split([params.shape[0] for params in params_list]))
+
+
+def apply_density_ops(q_device: tq.QuantumDevice, ops, max_fused_wires=4):
+    """Apply a whole list of gates to the densitymatrix of a QuantumDevice.
+
+    All matrices are built up front, with the parametric ones grouped per
+    gate kind through gate_matrices_many, and the sequence is applied with
+    apply_unitary_density_bmm_many. This skips the per-gate gate_wrapper
+    dispatch for circuits that are known ahead of time.
 
     Args:
         q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        ops (List[Tuple[str, Union[List[int], int], Optional[torch.Tensor]]]):
+            The (name, wires, params) of each gate in application order.
+            params is None for non-parametric gates, otherwise shaped as
+            for the gate functions.
+        max_fused_wires (int, optional): Passed to
+            apply_unitary_density_bmm_many. Default to 4.
 
     Returns:
         None.
     """
-    
-    name = "cu1"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
+    density = q_device.states
+    wires_list = _ops_wires_list(ops)
+    mats = _density_ops_matrices(density, ops, wires_list)
+
+    q_device.states = apply_unitary_density_bmm_many(
+        density, mats, wires_list, max_fused_wires
     )
 
 
-def cu2(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the cu2 gate.
+def _ops_wires_list(ops):
+    """Get the wires of each gate of a list of (name, wires, params), as
+    lists of ints.
 
     Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        ops (List[Tuple[str, Union[List[int], int], Optional[torch.Tensor]]]):
+            The (name, wires, params) of each gate.
 
     Returns:
-        None.
+        List[List[int]]: The wires of each gate.
     """
-    
-    name = "cu2"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
+    return [[wires] if isinstance(wires, int) else list(wires) for _, wires, _ in ops]
 
 
-def cu3(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the cu3 gate.
+def _density_ops_matrices(density, ops, wires_list):
+    """Build the matrices of a list of gates, grouping the parametric ones
+    per gate kind through gate_matrices_many.
 
     Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        density (torch.Tensor): The densitymatrix, whose dtype and device
+            the constant matrices are cached for.
+        ops (List[Tuple[str, Union[List[int], int], Optional[torch.Tensor]]]):
+            The (name, wires, params) of each gate.
+        wires_list (List[List[int]]): The wires of each gate.
 
     Returns:
-        None.
+        List[torch.Tensor]: The matrix of each gate.
     """
-    
-    name = "cu3"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
+    mats = [None] * len(ops)
+    grouped = {}
 
+    for k, (name, _, params) in enumerate(ops):
+        if params is None and name not in _mat_builder_calls:
+            mats[k] = _const_matrix_on_device(name, density.dtype, density.device)
+        else:
+            # multi-qubit builders are grouped per number of qubits too
+            n_wires = len(wires_list[k]) if name in _mat_builder_calls else None
+            grouped.setdefault((name, n_wires), []).append(k)
+
+    for (name, n_wires), indices in grouped.items():
+        params_list = [
+            _normalize_params(name, ops[k][2], density.device) for k in indices
+        ]
+        matrices = gate_matrices_many(name, params_list, n_wires)
+        for k, matrix in zip(indices, matrices):
+            mats[k] = matrix
+
+    return mats
 
-def su4(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the su4 gate.
+
+def contract_density_ops(q_device: tq.QuantumDevice, ops, optimize="auto"):
+    """Apply a whole list of gates to the densitymatrix of a QuantumDevice
+    as one tensor network contraction.
+
+    Each gate adds U on the row indices and conj(U) on the column indices
+    of its wires to a network around the densitymatrix. The network is
+    contracted with opt_einsum, which picks the pairwise order over the
+    whole circuit instead of following the gate order, e.g. merging small
+    gates with each other before touching the densitymatrix.
 
     Args:
         q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        ops (List[Tuple[str, Union[List[int], int], Optional[torch.Tensor]]]):
+            The (name, wires, params) of each gate in application order.
+            params is None for non-parametric gates, otherwise shaped as
+            for the gate functions.
+        optimize (str, optional): The opt_einsum path optimizer, e.g.
+            'auto-hq' for a slower but better search on deep circuits.
+            Default to 'auto'.
 
     Returns:
         None.
-
     """
-    name = "su4"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
+    density = q_device.states
+    n_qubit = int((density.dim() - 1) / 2)
+    wires_list = _ops_wires_list(ops)
+    mats = _density_ops_matrices(density, ops, wires_list)
+
+    symbols = (oe.get_symbol(k) for k in itertools.count())
+    batch_index = next(symbols)
+    row_indices = [next(symbols) for _ in range(n_qubit)]
+    col_indices = [next(symbols) for _ in range(n_qubit)]
+
+    operand_indices = [batch_index + "".join(row_indices + col_indices)]
+    operands = [density]
+
+    for mat, wires in zip(mats, wires_list):
+        mat = mat.to(device=density.device, dtype=density.dtype)
+        if mat.dim() > 2 and mat.shape[0] == 1:
+            mat = mat[0]
+        mat_batch_index = batch_index if mat.dim() > 2 else ""
+        mat = mat.reshape(list(mat.shape[:-2]) + [2] * len(wires) * 2)
+
+        for current, factor in [(row_indices, mat), (col_indices, torch.conj(mat))]:
+            new = [next(symbols) for _ in wires]
+            operand_indices.append(
+                mat_batch_index + "".join(new) + "".join(current[w] for w in wires)
+            )
+            operands.append(factor)
+            for w, index in zip(wires, new):
+                current[w] = index
+
+    equation = (
+        ",".join(operand_indices)
+        + "->"
+        + batch_index
+        + "".join(row_indices + col_indices)
+    )
+    q_device.states = oe.contract(
+        equation, *operands, optimize=optimize, backend="torch"
+    )
+
+
+class CapturedLayer:
+    """A list of gates recorded into a CUDA graph, replayed with new
+    params.
+
+    Created by capture_layer. The densitymatrix and the params live in
+    static buffers of the graph: replay copies the current densitymatrix
+    and the new params into them, launches the whole graph at once and
+    sets q_device.states to the output buffer. The output buffer is
+    overwritten by the next replay, so clone it to keep it.
+    """
+
+    def __init__(self, q_device: tq.QuantumDevice, ops, n_warmup=3):
+        self.q_device = q_device
+        self.ops = [
+            (name, [wires] if isinstance(wires, int) else list(wires), params)
+            for name, wires, params in ops
+        ]
+        self.static_params = [
+            None if params is None else params.detach().clone()
+            for _, _, params in self.ops
+        ]
+        self.static_input = q_device.states.detach().clone()
+
+        # the warmup fills the matrix and permutation caches, which must
+        # not allocate or copy from the host during capture
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.no_grad(), torch.cuda.stream(stream):
+            for _ in range(n_warmup):
+                self._run()
+        torch.cuda.current_stream().wait_stream(stream)
+
+        self.graph = torch.cuda.CUDAGraph()
+        with torch.no_grad(), torch.cuda.graph(self.graph):
+            self.static_output = self._run()
+        q_device.states = self.static_input
+
+    def _run(self):
+        self.q_device.states = self.static_input
+        for (name, wires, _), params in zip(self.ops, self.static_params):
+            func_name_dict[name](
+                self.q_device, wires, params=params, n_wires=len(wires)
+            )
+        return self.q_device.states
 
+    def replay(self, params_list=None):
+        """Apply the captured gates to the densitymatrix of the QuantumDevice.
 
-def qubitunitary(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the qubitunitary gate.
+        Args:
+            params_list (List[Optional[torch.Tensor]], optional): The new
+                params of each gate, None for gates without params or to
+                keep the captured ones. Default to None, which keeps all
+                captured params.
+
+        Returns:
+            None.
+        """
+        self.static_input.copy_(self.q_device.states)
+        if params_list is not None:
+            for buffer, params in zip(self.static_params, params_list):
+                if buffer is not None and params is not None:
+                    buffer.copy_(params)
+        self.graph.replay()
+        self.q_device.states = self.static_output
+
+
+def capture_layer(q_device: tq.QuantumDevice, ops, n_warmup=3):
+    """Record a list of gates into a CUDA graph (requires CUDA and
+    torch>=1.10).
+
+    For small densitymatrices the launch latency of the many small kernels
+    of a layer dominates; replaying a captured graph launches them all at
+    once. The capture runs without autograd, so this is for inference and
+    parameter scans, not training. Gates with host side checks, such as
+    qubitunitary, cannot be captured.
 
     Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        q_device (tq.QuantumDevice): The QuantumDevice, whose densitymatrix
+            is on a CUDA device.
+        ops (List[Tuple[str, Union[List[int], int], Optional[torch.Tensor]]]):
+            The (name, wires, params) of each gate in application order,
+            where params already has the shape of later replays.
+        n_warmup (int, optional): The number of runs before the capture.
+            Default to 3.
 
     Returns:
-        None.
+        CapturedLayer: The captured gates. The densitymatrix of q_device is
+            left unchanged.
     """
-    
-    name = "qubitunitary"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
+    return CapturedLayer(q_device, ops, n_warmup)
 
 
-def qubitunitaryfast(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the qubitunitaryfast gate.
+def fused_apply(q_device: tq.QuantumDevice, ops):
+    """Apply a list of gates to the densitymatrix of a QuantumDevice,
+    merging runs of Pauli and swap gates into one traversal.
+
+    A run of paulix, pauliy, pauliz and swap gates is accumulated as
+    Pauli wire masks followed by a wire permutation: a Pauli after some
+    swaps acts on the wire the swaps moved there. The run is applied with
+    apply_pauli_mask_density and a single permute when a gate of another
+    kind arrives or the list ends. Other gates go through their regular
+    gate function.
 
     Args:
         q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        ops (List[Tuple[str, Union[List[int], int], Optional[torch.Tensor]]]):
+            The (name, wires, params) of each gate in application order.
+            params is None for non-parametric gates.
 
     Returns:
         None.
     """
-    
-    name = "qubitunitaryfast"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
+    n_qubit = int((q_device.states.dim() - 1) / 2)
+    masks = [0, 0, 0]
+    # wire k of the permuted densitymatrix holds wire src[k] of the input
+    src = list(range(n_qubit))
+
+    def flush():
+        if any(masks):
+            q_device.states = apply_pauli_mask_density(q_device.states, *masks)
+        if src != list(range(n_qubit)):
+            # copied, so that the result does not alias the input
+            q_device.states = q_device.states.permute(
+                [0]
+                + [w + 1 for w in src]
+                + [w + 1 + n_qubit for w in src]
+            ).contiguous()
+        masks[:] = [0, 0, 0]
+        src[:] = list(range(n_qubit))
+
+    for name, wires, params in ops:
+        wires = [wires] if isinstance(wires, int) else list(wires)
+        if name in _pauli_mask_gates:
+            masks[_pauli_mask_gates[name]] ^= 1 << src[wires[0]]
+        elif name == "swap":
+            src[wires[0]], src[wires[1]] = src[wires[1]], src[wires[0]]
+        elif name != "i":
+            flush()
+            func_name_dict[name](
+                q_device, wires, params=params, n_wires=len(wires)
+            )
+    flush()
 
 
-def qubitunitarystrict(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the qubitunitarystrict = gate.
+def apply_rzz_layer(q_device: tq.QuantumDevice, wires_list, thetas):
+    """Apply a layer of RZZ gates to the densitymatrix of a QuantumDevice
+    in one pass.
+
+    RZZ gates are diagonal and commute, so the phases of the whole layer
+    are summed per basis state of the involved wires and applied with a
+    single apply_unitary_density_diagonal call, instead of reading and
+    writing the densitymatrix once per gate.
 
     Args:
         q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        wires_list (List[Tuple[int, int]]): The wires of each RZZ gate.
+        thetas (torch.Tensor): The rotation angles, real or complex, of
+            shape (n_gates,) or (bsz, n_gates).
 
     Returns:
         None.
     """
-    
-    name = "qubitunitarystrict"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
+    if len(wires_list) == 0:
+        return
 
+    density = q_device.states
+    wires = sorted(set(w for pair in wires_list for w in pair))
+    n_affected = len(wires)
 
-def multicnot(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the multi qubit cnot gate.
+    thetas = thetas.to(density.device)
+    if thetas.dim() == 1:
+        thetas = thetas.unsqueeze(0)
+
+    # z eigenvalue of each involved wire on each basis state, with the
+    # first wire as the most significant bit
+    basis = torch.arange(2**n_affected, device=density.device)
+    z = [
+        1 - 2 * ((basis >> (n_affected - 1 - k)) & 1) for k in range(n_affected)
+    ]
+    zz = torch.stack(
+        [z[wires.index(w0)] * z[wires.index(w1)] for w0, w1 in wires_list]
+    ).to(thetas.dtype)
+
+    # exp rather than torch.polar, which only takes real angles
+    diag = torch.exp(-0.5j * thetas.matmul(zz))
+
+    q_device.states = apply_unitary_density_diagonal(density, diag, wires)
+
+
+def hadamard_layer(q_device: tq.QuantumDevice, wires=None):
+    """Apply a hadamard gate to each of the given wires of the
+    densitymatrix of a QuantumDevice, as a Walsh-Hadamard transform.
+
+    Each wire is handled by an add/subtract butterfly on its row dim and
+    on its column dim. The 1/sqrt(2) factors of all gates are folded into
+    a single final scaling, so no gate matrix is built or multiplied.
 
     Args:
         q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        wires (Union[List[int], int], optional): Which qubits to apply the
+            hadamard gates to. Default to None, meaning all qubits.
 
     Returns:
         None.
     """
-    
-    name = "multicnot"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
+    density = q_device.states
+    n_qubit = int((density.dim() - 1) / 2)
+    if wires is None:
+        wires = list(range(n_qubit))
+    wires = [wires] if isinstance(wires, int) else wires
 
+    for w in wires:
+        for dim in [w + 1, w + 1 + n_qubit]:
+            zero = density.narrow(dim, 0, 1)
+            one = density.narrow(dim, 1, 1)
+            density = torch.cat([zero + one, zero - one], dim=dim)
 
-def multixcnot(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the multi qubit xcnot gate.
+    q_device.states = density * 0.5 ** len(wires)
+
+
+def _make_gate(name, description):
+    """Create the function applying a gate of mat_dict to a QuantumDevice.
+
+    The matrix (or matrix builder) is looked up once here and bound to the
+    returned function, so calling a gate does not go through mat_dict.
 
     Args:
-        q_device (tq.QuantumDevice): The QuantumDevice.
-        wires (Union[List[int], int]): Which qubit(s) to apply the gate.
-        params (torch.Tensor, optional): Parameters (if any) of the gate.
-            Default to None.
-        n_wires (int, optional): Number of qubits the gate is applied to.
-            Default to None.
-        static (bool, optional): Whether use static mode computation.
-            Default to False.
-        parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
-            current operation. Default to None.
-        inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        name (str): The name of the gate in mat_dict.
+        description (str): The gate name used in the docstring.
 
     Returns:
-        None.
+        Callable: The gate function.
     """
-    
-    name = "multixcnot"
     mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
 
+    def gate(
+        q_device,
+        wires,
+        params=None,
+        n_wires=None,
+        static=False,
+        parent_graph=None,
+        inverse=False,
+        comp_method="bmm",
+    ):
+        # positional arguments, in the order of the gate_wrapper signature
+        gate_wrapper(
+            name,
+            mat,
+            comp_method,
+            q_device,
+            wires,
+            params,
+            n_wires,
+            static,
+            parent_graph,
+            inverse,
+        )
 
-def single_excitation(
-    q_device,
-    wires,
-    params=None,
-    n_wires=None,
-    static=False,
-    parent_graph=None,
-    inverse=False,
-    comp_method="bmm",
-):
-    """Perform the single excitation gate.
+    gate.__name__ = name
+    gate.__qualname__ = name
+    gate.__doc__ = f"""Perform the {description} gate.
 
     Args:
         q_device (tq.QuantumDevice): The QuantumDevice.
@@ -3445,28 +2547,59 @@ def single_excitation(
         parent_graph (tq.QuantumGraph, optional): Parent QuantumGraph of
             current operation. Default to None.
         inverse (bool, optional): Whether inverse the gate. Default to False.
-        comp_method (bool, optional): Use 'bmm' or 'einsum' method to perform
-        matrix vector multiplication. Default to 'bmm'.
+        comp_method (bool, optional): Use 'bmm', 'einsum' or 'cuquantum'
+        method to perform matrix vector multiplication. Default to 'bmm'.
 
     Returns:
         None.
     """
-    
-    name = "single_excitation"
-    mat = mat_dict[name]
-    gate_wrapper(
-        name=name,
-        mat=mat,
-        method=comp_method,
-        q_device=q_device,
-        wires=wires,
-        params=params,
-        n_wires=n_wires,
-        static=static,
-        parent_graph=parent_graph,
-        inverse=inverse,
-    )
 
+    return gate
+
+
+hadamard = _make_gate("hadamard", "hadamard")
+shadamard = _make_gate("shadamard", "shadamard")
+paulix = _make_gate("paulix", "Pauli X")
+pauliy = _make_gate("pauliy", "Pauli Y")
+pauliz = _make_gate("pauliz", "Pauli Z")
+i = _make_gate("i", "I")
+s = _make_gate("s", "s")
+t = _make_gate("t", "t")
+sx = _make_gate("sx", "sx")
+cnot = _make_gate("cnot", "cnot")
+cz = _make_gate("cz", "cz")
+cy = _make_gate("cy", "cy")
+rx = _make_gate("rx", "rx")
+ry = _make_gate("ry", "ry")
+rz = _make_gate("rz", "rz")
+rxx = _make_gate("rxx", "rxx")
+ryy = _make_gate("ryy", "ryy")
+rzz = _make_gate("rzz", "rzz")
+rzx = _make_gate("rzx", "rzx")
+swap = _make_gate("swap", "swap")
+sswap = _make_gate("sswap", "sswap")
+cswap = _make_gate("cswap", "cswap")
+toffoli = _make_gate("toffoli", "toffoli")
+phaseshift = _make_gate("phaseshift", "phaseshift")
+rot = _make_gate("rot", "rot")
+multirz = _make_gate("multirz", "multi qubit RZ")
+crx = _make_gate("crx", "crx")
+cry = _make_gate("cry", "cry")
+crz = _make_gate("crz", "crz")
+crot = _make_gate("crot", "crot")
+u1 = _make_gate("u1", "u1")
+u2 = _make_gate("u2", "u2")
+u3 = _make_gate("u3", "u3")
+cu1 = _make_gate("cu1", "cu1")
+cu2 = _make_gate("cu2", "cu2")
+cu3 = _make_gate("cu3", "cu3")
+su4 = _make_gate("su4", "su4")
+qubitunitary = _make_gate("qubitunitary", "qubitunitary")
+qubitunitaryfast = _make_gate("qubitunitaryfast", "qubitunitaryfast")
+qubitunitarystrict = _make_gate("qubitunitarystrict", "qubitunitarystrict")
+multicnot = _make_gate("multicnot", "multi qubit cnot")
+multixcnot = _make_gate("multixcnot", "multi qubit xcnot")
+single_excitation = _make_gate("single_excitation", "single excitation")
 
 h = hadamard
 sh = shadamard